@@ -1,7 +1,13 @@
 import os
 import re
-import difflib
 import sys
+import time
+import difflib
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
 
 # ==== CONFIGURATION ====
 
@@ -25,7 +31,11 @@ COMMENT_STYLES = {
     ".cfg": '; {}'
 }
 
-SIMILARITY_THRESHOLD = 0.85
+# Minimum similarity() for a header to count as current. Calibrated to give
+# the same decisions as the former difflib ratio >= 0.85 (see bench_license.py)
+SIMILARITY_THRESHOLD = 0.78
+# Words per shingle in similarity()
+SHINGLE_SIZE = 2
 FILE_EXTENSIONS = list(COMMENT_STYLES.keys())
 IGNORE_DIRS = ["venv", "__pycache__", "logs", "assets", ".git", ".vscode"]
 
@@ -45,103 +55,630 @@ def format_license(ext):
     else:
         return style.format(RAW_LICENSE_TEXT)
 
+# Characters from the top of a file in which a license block must start and end
+HEADER_SCAN_LIMIT = 4096
+# Shebang, encoding or other "#" comment lines a license block may sit under
+MAX_PREAMBLE_LINES = 16
+# Extensions whose files can start with a shebang and an encoding declaration
+SCRIPT_EXTENSIONS = (".py",)
+
 def license_pattern(ext):
+    """
+    Source of the regex matching one license block at the start of a file.
+
+    The block may only be preceded by whitespace and, in SCRIPT_EXTENSIONS,
+    up to MAX_PREAMBLE_LINES blank or "#" lines (shebang, encoding,
+    comments). Each part runs up to the first occurrence of the next literal
+    ("Copyright", "Unauthorized use", then the comment close). These are
+    tempered tokens, not lazy .*?, so a failed match backtracks linearly
+    instead of trying every later "Copyright".
+    """
     if ext in [".py", ".md"]:
-        return r'(\"\"\"|<!--).*?Copyright.*?Unauthorized use.*?(\"\"\"|-->)'
+        opener, closer = r'(?:\"\"\"|<!--)', r'.*?(?:\"\"\"|-->)'
     elif ext in [".json"]:
-        return r'(//.*?Copyright.*?Unauthorized use.*?)\n'
+        opener, closer = r'//', r'.*?\n'
     else:
-        return r'([#;].*?Copyright.*?Unauthorized use.*?)\n'
+        opener, closer = r'[#;]', r'.*?\n'
+    preamble = r'(?:[ \t]*(?:#[^\n]*)?\n){0,%d}?' % MAX_PREAMBLE_LINES if ext in SCRIPT_EXTENSIONS else ''
+    return (
+        preamble + r'\s*(?P<block>' + opener
+        + r'(?:(?!Copyright).)*Copyright(?:(?!Unauthorized use).)*Unauthorized use'
+        + closer + r')'
+    )
+
+# Compiled once per extension; used with match(), so only the top is tried
+LICENSE_REGEXES = {ext: re.compile(license_pattern(ext), re.DOTALL) for ext in COMMENT_STYLES}
+
+# Lines that must stay first in a script: a shebang, then an encoding declaration
+SCRIPT_PREAMBLE = re.compile(r'(?:#![^\n]*\n)?(?:[ \t]*#[^\n]*coding[:=][^\n]*\n)?')
+
+def match_license(text, ext, pos=0):
+    """The license block near pos (see license_pattern), or None; never looks past HEADER_SCAN_LIMIT."""
+    return LICENSE_REGEXES[ext].match(text, pos, pos + HEADER_SCAN_LIMIT)
+
+def remove_all_license_blocks(text, ext):
+    """Strip the license blocks stacked at the top of text, keeping the lines above them."""
+    match = match_license(text, ext)
+    if not match:
+        return text
+    preamble = text[:match.start("block")].rstrip()
+    pos = match.end()
+    match = match_license(text, ext, pos)
+    while match:
+        pos = match.end()
+        match = match_license(text, ext, pos)
+    return preamble + "\n" + text[pos:].lstrip() if preamble else text[pos:]
+
+def insert_license(text, ext):
+    """text with the current header on top, below any shebang and encoding lines of a script."""
+    preamble = SCRIPT_PREAMBLE.match(text).group(0) if ext in SCRIPT_EXTENSIONS else ""
+    return preamble + LICENSE_HEADERS[ext] + "\n\n" + text[len(preamble):].lstrip()
+
+def normalize_block(text):
+    return " ".join(text.split())
+
+def shingles(text):
+    """Set of every run of SHINGLE_SIZE consecutive words in text."""
+    words = text.split()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
 
-def remove_all_license_blocks(text, pattern):
-    return re.sub(pattern, "", text, flags=re.DOTALL)
+def _dice(a, b):
+    total = len(a) + len(b)
+    return 2 * len(a & b) / total if total else 1.0
 
 def similarity(a, b):
-    return difflib.SequenceMatcher(None, a.strip(), b.strip()).ratio()
+    """
+    Dice coefficient of the word shingles of a and b, from 0.0 to 1.0.
+
+    Linear in the length of both texts, unlike difflib.SequenceMatcher.
+    """
+    return _dice(shingles(a), shingles(b))
+
+# Current header per extension, formatted once instead of for every file
+LICENSE_HEADERS = {ext: format_license(ext) for ext in COMMENT_STYLES}
+_NORMALIZED_HEADERS = {ext: normalize_block(header) for ext, header in LICENSE_HEADERS.items()}
+_HEADER_SHINGLES = {ext: shingles(header) for ext, header in LICENSE_HEADERS.items()}
+
+def header_is_current(block, ext):
+    """True if block matches the current header for ext, exactly up to whitespace or by similarity."""
+    normalized = normalize_block(block)
+    if normalized == _NORMALIZED_HEADERS[ext]:
+        return True
+    return _dice(shingles(normalized), _HEADER_SHINGLES[ext]) >= SIMILARITY_THRESHOLD
 
 def clean_and_insert_license(text, ext):
-    pattern = license_pattern(ext)
-    cleaned = remove_all_license_blocks(text, pattern).lstrip()
-    return format_license(ext) + "\n\n" + cleaned
+    cleaned = remove_all_license_blocks(text, ext).lstrip()
+    return insert_license(cleaned, ext)
 
 # ==== PER-FILE LOGIC ====
 
-def process_file(filepath, project_root, remove_mode=False):
+# Bytes read to decide whether a file needs work; always holds the first
+# HEADER_SCAN_LIMIT characters, whatever their UTF-8 width
+HEAD_BYTES = 4 * HEADER_SCAN_LIMIT
+
+OUTCOMES = {
+    "protected": "⏭ Skipped (protected file)",
+    "skipped": "⏭ Skipped (blacklisted or unsupported)",
+    "present": "✔ License already present",
+    "added": "🔐 License added",
+    "replaced": "🧼 Replaced outdated license",
+    "removed": "🧹 License removed",
+    "absent": "✔ No license found",
+    "error": "❌ Failed",
+}
+
+def read_text(filepath):
+    with open(filepath, "r", encoding="utf-8") as f:
+        return f.read()
+
+def file_signature(filepath):
+    st = os.stat(filepath)
+    return st.st_mtime_ns, st.st_size
+
+def decode_text(data):
+    """UTF-8 bytes as read_text() would return them, universal newlines included."""
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+def process_file(filepath, project_root, remove_mode=False, with_digest=False):
+    """
+    Decide what to do with the license header of one file, without writing.
+
+    Returns (OUTCOMES key, new text, digest). The new text is None when the
+    file stays as it is; then, with with_digest, digest is the SHA-256 of
+    its bytes, for VerifiedCache. License blocks are only looked for at the
+    top of the file, so the first HEAD_BYTES decide: a file that already
+    carries the current header, or has none to remove, is settled without
+    a full read unless its digest is wanted. A file that does not start
+    with a comment fails the match on its first character.
+    """
     rel_path = os.path.relpath(filepath, project_root)
     ext = os.path.splitext(filepath)[1]
 
     # 🚫 Skip LICENSE.txt and this script itself
     if os.path.basename(filepath) in ["LICENSE.txt", "apply_license.py"]:
-        print(f"⏭ Skipped (protected file): {rel_path}")
-        return
+        return "protected", None, None
 
     if ext not in COMMENT_STYLES or rel_path in BLACKLIST_FILES:
-        print(f"⏭ Skipped (blacklisted or unsupported): {rel_path}")
-        return
-
-    with open(filepath, "r", encoding="utf-8") as f:
-        original = f.read()
+        return "skipped", None, None
 
-    pattern = license_pattern(ext)
+    unchanged = "absent" if remove_mode else "present"
+    with open(filepath, "rb") as f:
+        head = f.read(HEAD_BYTES)
+        match = match_license(head.decode("utf-8", errors="ignore"), ext)
 
-    if remove_mode:
-        cleaned = remove_all_license_blocks(original, pattern).lstrip()
-        if cleaned != original:
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(cleaned)
-            print(f"🧹 License removed: {rel_path}")
+        if remove_mode:
+            settled = not match
         else:
-            print(f"✔ No license found: {rel_path}")
-        return
+            settled = bool(match) and header_is_current(match.group("block"), ext)
+        if settled and not with_digest:
+            return unchanged, None, None
 
+        data = head + f.read()
 
-    if remove_mode:
-        cleaned = remove_all_license_blocks(original, pattern).lstrip()
-        if cleaned != original:
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(cleaned)
-            print(f"🧹 License removed: {rel_path}")
+    if not settled:
+        original = decode_text(data)
+        if remove_mode:
+            updated, outcome = remove_all_license_blocks(original, ext).lstrip(), "removed"
+        elif match:
+            updated, outcome = clean_and_insert_license(original, ext), "replaced"
         else:
-            print(f"✔ No license found: {rel_path}")
-        return
+            updated, outcome = insert_license(original.lstrip(), ext), "added"
+        if updated != original:
+            return outcome, updated, None
 
-    match = re.search(pattern, original, flags=re.DOTALL)
-    new_license = format_license(ext)
+    return unchanged, None, hashlib.sha256(data).hexdigest() if with_digest else None
 
-    if match:
-        existing_license = match.group(0)
-        score = similarity(existing_license, new_license)
+def _process_one(task):
+    filepath, project_root, remove_mode, with_digest = task
+    try:
+        signature = file_signature(filepath)
+        outcome, new_text, digest = process_file(filepath, project_root, remove_mode, with_digest)
+        return outcome, new_text, signature, digest, None
+    except (OSError, UnicodeDecodeError) as e:
+        return "error", None, None, None, str(e)
 
-        if score >= SIMILARITY_THRESHOLD:
-            print(f"✔ License already present: {rel_path}")
-        else:
-            new_text = clean_and_insert_license(original, ext)
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(new_text)
-            print(f"🧼 Replaced outdated license: {rel_path}")
-    else:
-        new_text = new_license + "\n\n" + original.lstrip()
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(new_text)
-        print(f"🔐 License added: {rel_path}")
+# ==== CHANGE SET ====
+
+# Files written before their fsyncs are issued and their renames done
+FSYNC_BATCH = 256
+
+class Change:
+    """One planned edit: the new content of path, as decided by process_file."""
+
+    __slots__ = ("path", "outcome", "new_text", "signature")
+
+    def __init__(self, path, outcome, new_text, signature):
+        self.path = path
+        self.outcome = outcome
+        self.new_text = new_text
+        # (mtime_ns, size) when planned; a file edited since is left alone
+        self.signature = signature
+
+def _write_temp(change):
+    """Write change.new_text next to its file; returns the open temp file, not yet synced."""
+    directory, name = os.path.split(change.path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    f = os.fdopen(fd, "w", encoding="utf-8")
+    try:
+        f.write(change.new_text)
+        f.flush()
+        os.chmod(tmp_path, os.stat(change.path).st_mode & 0o7777)
+    except BaseException:
+        f.close()
+        os.unlink(tmp_path)
+        raise
+    return f, tmp_path
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _apply_batch(batch, failures):
+    pending = []
+    try:
+        for change in batch:
+            try:
+                if file_signature(change.path) != change.signature:
+                    raise OSError(f"{change.path} changed since the sweep started")
+                pending.append((change, *_write_temp(change)))
+            except OSError as e:
+                failures.append((change, str(e)))
+
+        # Every temp file is written before the first fsync, so the kernel
+        # can flush them together instead of one write-and-wait at a time
+        for _, f, _ in pending:
+            os.fsync(f.fileno())
+            f.close()
+
+        directories = set()
+        while pending:
+            change, _, tmp_path = pending.pop()
+            try:
+                os.replace(tmp_path, change.path)
+                directories.add(os.path.dirname(change.path))
+            except OSError as e:
+                os.unlink(tmp_path)
+                failures.append((change, str(e)))
+        for directory in directories:
+            _fsync_dir(directory)
+    finally:
+        for _, f, tmp_path in pending:
+            f.close()
+            os.unlink(tmp_path)
+
+def apply_changes(changes, batch_size=FSYNC_BATCH):
+    """
+    Write every change through a temp file and os.replace; returns (change, error) failures.
+
+    Each file is either fully updated or left as it was, even when the run
+    is interrupted. Files not in changes are never opened for writing, so
+    their mtimes stay the same.
+    """
+    failures = []
+    for i in range(0, len(changes), batch_size):
+        _apply_batch(changes[i:i + batch_size], failures)
+    return failures
+
+def print_diff(changes, root_dir, out=sys.stdout):
+    for change in changes:
+        rel_path = os.path.relpath(change.path, root_dir).replace(os.sep, "/")
+        out.writelines(difflib.unified_diff(
+            read_text(change.path).splitlines(keepends=True),
+            change.new_text.splitlines(keepends=True),
+            fromfile=f"a/{rel_path}",
+            tofile=f"b/{rel_path}",
+        ))
+
+# ==== VERIFIED CACHE ====
+
+# Default record of verified files, relative to the scanned root
+VERIFIED_CACHE_NAME = ".apply_license_cache.sqlite3"
+# Bump when process_file decides differently on the same content for a
+# reason _rules_digest() does not see, such as a change in its code
+VERIFIED_CACHE_VERSION = "3"
+
+def _rules_digest():
+    """Changes whenever a verdict recorded by VerifiedCache could change."""
+    rules = [
+        VERIFIED_CACHE_VERSION, LICENSE_HEADERS,
+        {ext: regex.pattern for ext, regex in LICENSE_REGEXES.items()}, SCRIPT_PREAMBLE.pattern,
+        SCRIPT_EXTENSIONS, MAX_PREAMBLE_LINES, HEADER_SCAN_LIMIT, SIMILARITY_THRESHOLD, SHINGLE_SIZE,
+    ]
+    return hashlib.sha256(repr(rules).encode("utf-8")).hexdigest()
+
+class VerifiedCache:
+    """
+    SQLite record of the files a sweep found to need no change, so later
+    runs skip them without calling process_file.
+
+    Verdicts are keyed by the SHA-256 of the content, with the extension
+    and mode (add or remove). The main process only compares stats against
+    a path -> (size, mtime_ns, sha256) table and never reads a file; any
+    file whose stat changed goes to process_file, which hashes the bytes
+    it reads in the worker. A touched, renamed or re-checked-out file then
+    finds its verdict again. Verdicts are dropped whenever the header or
+    the matching rules change.
+
+    preload=True reads the whole record up front, which suits full sweeps;
+    otherwise each file is looked up on its own, which suits the few files
+    of a --staged run.
+    """
+
+    # See ImportCache.RACY_NS in req_gen.py
+    RACY_NS = 2_000_000_000
+
+    def __init__(self, path, root_dir, preload=True):
+        import sqlite3
+
+        self.root_dir = root_dir
+        self._prefix = os.path.join(root_dir, "")
+        self.hits = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verified (sha256 TEXT, ext TEXT, mode TEXT, PRIMARY KEY (sha256, ext, mode))"
+        )
+
+        version = _rules_digest()
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            with self._db:
+                self._db.execute("DELETE FROM verified")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+
+        self._files = None
+        self._verified = set()
+        if preload:
+            self._files = {path: (size, mtime_ns, sha) for path, size, mtime_ns, sha in self._db.execute("SELECT * FROM files")}
+            self._verified = set(self._db.execute("SELECT * FROM verified"))
+        self._file_updates = {}
+        self._new_verified = set()
+        self._started_ns = time.time_ns()
+
+    def _key(self, file_path):
+        # Paths come from walking root_dir, so slicing is enough for most
+        if file_path.startswith(self._prefix):
+            return file_path[len(self._prefix):].replace(os.sep, "/")
+        return os.path.relpath(file_path, self.root_dir).replace(os.sep, "/")
+
+    def _stored_file(self, key):
+        if self._files is not None:
+            return self._files.get(key)
+        return self._db.execute("SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (key,)).fetchone()
+
+    def _has_verdict(self, verdict):
+        if verdict in self._verified:
+            return True
+        if self._files is not None:
+            return False
+        return self._db.execute(
+            "SELECT 1 FROM verified WHERE sha256 = ? AND ext = ? AND mode = ?", verdict
+        ).fetchone() is not None
+
+    def _remember(self, key, signature, sha):
+        mtime_ns, size = signature
+        if mtime_ns >= self._started_ns - self.RACY_NS:
+            mtime_ns = 0
+        self._file_updates[key] = (size, mtime_ns, sha)
+
+    def is_verified(self, file_path, mode):
+        """True if the stat of file_path matches its record and that content has a verdict."""
+        row = self._stored_file(self._key(file_path))
+        if row is None:
+            return False
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        if (st.st_size, st.st_mtime_ns) != row[:2]:
+            return False
+        if not self._has_verdict((row[2], os.path.splitext(file_path)[1], mode)):
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, file_path, mode, signature=None, digest=None, text=None):
+        """
+        Record the content of file_path as needing no change in mode.
+
+        digest is the SHA-256 process_file took of the bytes it read, and
+        signature the (mtime_ns, size) from just before the read: should the
+        file change after it, the recorded stat no longer matches and the
+        next run hashes it again. text is content just written, hashed
+        instead of reading the file back.
+        """
+        if text is not None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return
+            signature = (st.st_mtime_ns, st.st_size)
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if digest is None or signature is None:
+            return
+        self._remember(self._key(file_path), signature, digest)
+        verdict = (digest, os.path.splitext(file_path)[1], mode)
+        self._verified.add(verdict)
+        self._new_verified.add(verdict)
+
+    def save(self, file_paths=None):
+        """Write new entries; given every file of the root (and preloaded), also forget the rest."""
+        if self._files is None:
+            file_paths = None
+        with self._db:
+            if file_paths is not None:
+                live = {self._key(p) for p in file_paths}
+                gone = [(path,) for path in self._files if path not in live]
+                self._db.executemany("DELETE FROM files WHERE path = ?", gone)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                [(path, *row) for path, row in self._file_updates.items()],
+            )
+            self._db.executemany("INSERT OR IGNORE INTO verified VALUES (?, ?, ?)", self._new_verified)
+            if file_paths is not None:
+                # Verdicts on content no file has any more
+                self._db.execute("DELETE FROM verified WHERE sha256 NOT IN (SELECT sha256 FROM files)")
+        self._db.close()
 
 # ==== DIRECTORY SCANNER ====
 
-def should_ignore(path):
-    return any(skip in path for skip in IGNORE_DIRS)
+def should_ignore(rel_path):
+    """True if any directory of rel_path is in IGNORE_DIRS."""
+    return any(part in IGNORE_DIRS for part in rel_path.replace(os.sep, "/").split("/")[:-1])
 
-def scan_folder(root_dir, remove_mode=False):
-    for dirpath, _, filenames in os.walk(root_dir):
-        if should_ignore(dirpath):
-            continue
+def is_candidate(rel_path):
+    return rel_path.endswith(tuple(FILE_EXTENSIONS)) and not should_ignore(rel_path)
+
+def iter_candidate_files(root_dir):
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if d not in IGNORE_DIRS]
         for file in filenames:
-            if any(file.endswith(ext) for ext in FILE_EXTENSIONS):
-                full_path = os.path.join(dirpath, file)
-                process_file(full_path, root_dir, remove_mode)
+            if file.endswith(tuple(FILE_EXTENSIONS)):
+                yield os.path.join(dirpath, file)
+
+def _git(root_dir, *args):
+    result = subprocess.run(["git", "-C", root_dir, *args], capture_output=True, check=True)
+    return [path for path in os.fsdecode(result.stdout).split("\0") if path]
+
+def iter_git_files(root_dir, since=None, staged=False):
+    """
+    Candidate files under root_dir that git reports as changed: staged for
+    commit, or differing from the since ref (untracked files included).
+    Raises subprocess.CalledProcessError outside a git repository or for an
+    unknown ref.
+    """
+    # Outside a repository git diff would silently compare files instead
+    _git(root_dir, "rev-parse", "--git-dir")
+    diff = ["diff", "--name-only", "--relative", "-z", "--diff-filter=ACMR"]
+    if staged:
+        paths = _git(root_dir, *diff, "--cached")
+    else:
+        paths = _git(root_dir, *diff, since, "--")
+        paths += _git(root_dir, "ls-files", "--others", "--exclude-standard", "-z")
+
+    for rel_path in dict.fromkeys(paths):
+        path = os.path.join(root_dir, rel_path)
+        if is_candidate(rel_path) and os.path.isfile(path):
+            yield path
+
+def plan_changes(root_dir, remove_mode=False, workers=1, verbose=False, files=None, cache=None):
+    """
+    Run process_file over files (default: every candidate under root_dir),
+    writing nothing.
+
+    Returns (changes, counts): a Change per file whose content would differ,
+    and a Counter of outcomes. Files the cache has verified are counted
+    without being read. workers > 1 spreads process_file over a process
+    pool, in chunks so each round trip handles many small files.
+    """
+    if files is None:
+        files = iter_candidate_files(root_dir)
+    mode = "remove" if remove_mode else "add"
+    settled = "absent" if remove_mode else "present"
+
+    counts = Counter()
+    pending = []
+    for path in files:
+        if cache is not None and cache.is_verified(path, mode):
+            counts[settled] += 1
+            if verbose:
+                print(f"{OUTCOMES[settled]}: {os.path.relpath(path, root_dir)}")
+        else:
+            pending.append(path)
+    tasks = [(path, root_dir, remove_mode, cache is not None) for path in pending]
+
+    if workers <= 1 or len(tasks) < 2:
+        results = map(_process_one, tasks)
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, min(256, len(tasks) // (workers * 8)))
+        results = pool.map(_process_one, tasks, chunksize=chunksize)
+
+    changes = []
+    try:
+        for path, (outcome, new_text, signature, digest, error) in zip(pending, results):
+            counts[outcome] += 1
+            if new_text is not None:
+                changes.append(Change(path, outcome, new_text, signature))
+            elif digest is not None:
+                cache.add(path, mode, signature, digest)
+            rel_path = os.path.relpath(path, root_dir)
+            if outcome == "error":
+                print(f"{OUTCOMES[outcome]}: {rel_path} ({error})")
+            elif verbose:
+                print(f"{OUTCOMES[outcome]}: {rel_path}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return changes, counts
+
+def scan_folder(root_dir, remove_mode=False, workers=1, verbose=False, dry_run=False, files=None, cache=None):
+    """Plan every edit under root_dir, then apply them unless dry_run; returns a Counter of outcomes."""
+    changes, counts = plan_changes(root_dir, remove_mode, workers, verbose, files, cache)
+    if dry_run:
+        return counts
+
+    failed = set()
+    for change, error in apply_changes(changes):
+        failed.add(change.path)
+        counts[change.outcome] -= 1
+        counts["error"] += 1
+        print(f"{OUTCOMES['error']}: {os.path.relpath(change.path, root_dir)} ({error})")
+
+    if cache is not None:
+        mode = "remove" if remove_mode else "add"
+        for change in changes:
+            if change.path not in failed:
+                cache.add(change.path, mode, text=change.new_text)
+    return counts
+
+def print_summary(counts, dry_run=False, out=sys.stdout):
+    print(f"\n{sum(counts.values())} files" + (" (dry run, nothing written)" if dry_run else ""), file=out)
+    for outcome, label in OUTCOMES.items():
+        if counts[outcome]:
+            print(f"  {label:<40}{counts[outcome]:>8}", file=out)
 
 # ==== EXECUTION ====
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add, refresh or remove license headers")
+    parser.add_argument(
+        "root",
+        nargs="?",
+        default=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+        help="Project root (default: the parent of this script's folder)",
+    )
+    parser.add_argument("--remove", action="store_true", help="Strip license headers instead of adding them")
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=0,
+        help="Processes used to handle files; 0 = all cores (default: 0)",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print one line per file")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--diff", action="store_true", help="Print a unified diff of every change (implies --dry-run)")
+    changed = parser.add_mutually_exclusive_group()
+    changed.add_argument("--since", metavar="REF", help="Only files changed since the git ref REF, plus untracked files")
+    changed.add_argument("--staged", action="store_true", help="Only files staged for commit (for a pre-commit hook)")
+    parser.add_argument(
+        "--cache",
+        help=f"Record of verified files (default: <root>/{VERIFIED_CACHE_NAME})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Check every file and do not read or write the verified record",
+    )
+    args = parser.parse_args()
+    if args.since is not None and args.since.startswith("-"):
+        parser.error(f"--since expects a git ref, got {args.since!r}")
+    args.dry_run = args.dry_run or args.diff
+    return args
+
 if __name__ == "__main__":
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    remove_mode = "--remove" in sys.argv
-    scan_folder(project_root, remove_mode)
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    if args.since or args.staged:
+        try:
+            files = list(iter_git_files(args.root, args.since, args.staged))
+        except (OSError, subprocess.CalledProcessError) as e:
+            detail = getattr(e, "stderr", None)
+            sys.exit(f"❌ git failed: {os.fsdecode(detail).strip() if detail else e}")
+    else:
+        files = list(iter_candidate_files(args.root))
+
+    cache = None
+    if not args.no_cache:
+        cache = VerifiedCache(
+            args.cache or os.path.join(args.root, VERIFIED_CACHE_NAME),
+            args.root,
+            preload=not (args.since or args.staged),
+        )
+
+    try:
+        if args.diff:
+            changes, counts = plan_changes(args.root, args.remove, workers, args.verbose, files, cache)
+            print_diff(changes, args.root)
+            # Summary on stderr so the diff can be piped to a file or git apply
+            print_summary(counts, dry_run=True, out=sys.stderr)
+        else:
+            counts = scan_folder(args.root, args.remove, workers, args.verbose, args.dry_run, files, cache)
+            print_summary(counts, args.dry_run)
+    finally:
+        if cache is not None:
+            cache.save(None if args.since or args.staged else files)
+
+    if cache is not None and cache.hits:
+        print(f"  ({cache.hits} verified earlier, not checked again)", file=sys.stderr if args.diff else sys.stdout)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+#
+# Author: Crazygiscool
+# Description: Benchmarks for the slow stages of build.py.
+
+import os
+import sys
+import time
+import random
+import hashlib
+import tarfile
+import tempfile
+import argparse
+
+import build
+import cerberus_payload
+
+
+# -----------------------------
+# SYNTHETIC TREE
+# -----------------------------
+def make_tree(root, n_files, files_per_dir=50, seed=0):
+    """
+    Create a synthetic project tree with n_files files.
+
+    Mix of packages (with __init__.py), pure data dirs and some ignored
+    dirs so both the package and the data passes have work to do.
+    """
+    rng = random.Random(seed)
+
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("*.egg-info\nmodels/cache\n")
+
+    made = 0
+    dirs = [""]
+    while made < n_files:
+        parent = rng.choice(dirs)
+        kind = rng.random()
+        name = f"d{len(dirs)}"
+        if kind < 0.05:
+            name = rng.choice(["__pycache__", "venv", "cache", "x.egg-info"])
+        rel = f"{parent}/{name}" if parent else name
+        path = os.path.join(root, rel)
+        os.makedirs(path, exist_ok=True)
+        if rel.count("/") < 6:
+            dirs.append(rel)
+
+        is_pkg = kind < 0.5
+        if is_pkg:
+            open(os.path.join(path, "__init__.py"), "w").close()
+            made += 1
+
+        for i in range(min(files_per_dir, n_files - made)):
+            ext = ".py" if is_pkg and i % 4 else ".json"
+            open(os.path.join(path, f"f{i}{ext}"), "w").close()
+            made += 1
+
+    return made
+
+
+# -----------------------------
+# REFERENCE IMPLEMENTATION
+# -----------------------------
+def legacy_detect_packages_and_data(root="."):
+    """The original two-pass os.walk detector, kept for comparison."""
+    packages = []
+    data_dirs = []
+
+    gitignore_spec = build.load_gitignore_spec(root)
+
+    all_packages = set()
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_path = os.path.relpath(dirpath, root)
+
+        if rel_path == ".":
+            continue
+
+        folder = os.path.basename(dirpath)
+        if folder in build.IGNORE_DIRS:
+            dirnames[:] = []
+            continue
+
+        if gitignore_spec.match_file(rel_path):
+            dirnames[:] = []
+            continue
+
+        if "__init__.py" in filenames:
+            all_packages.add(rel_path.replace("\\", "/"))
+
+    for pkg in all_packages:
+        parent = os.path.dirname(pkg)
+        if parent == "" or parent == "." or parent not in all_packages:
+            packages.append(pkg)
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_path = os.path.relpath(dirpath, root)
+        if rel_path == ".":
+            continue
+
+        folder = os.path.basename(dirpath)
+        if folder in build.IGNORE_DIRS:
+            dirnames[:] = []
+            continue
+
+        if gitignore_spec.match_file(rel_path):
+            dirnames[:] = []
+            continue
+
+        has_non_py = any(not f.endswith(".py") for f in filenames)
+        if has_non_py:
+            data_dirs.append(rel_path.replace("\\", "/"))
+
+    return packages, data_dirs
+
+
+# -----------------------------
+# BENCHMARKS
+# -----------------------------
+def timed(fn, *args, repeat=3, **kwargs):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_scan(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"[*] Creating synthetic tree with {args.files} files in {tmp}...")
+        made = make_tree(tmp, args.files)
+        print(f"    {made} files created")
+
+        old_t, (old_pkgs, old_data) = timed(legacy_detect_packages_and_data, tmp, repeat=args.repeat)
+        new_t, (new_pkgs, new_data) = timed(
+            build.detect_packages_and_data, tmp, workers=args.workers, repeat=args.repeat
+        )
+
+        same = set(old_pkgs) == set(new_pkgs) and old_data == new_data
+        print(f"\n{'implementation':<24}{'best (s)':>12}")
+        print(f"{'two-pass os.walk':<24}{old_t:>12.3f}")
+        print(f"{'single-pass scandir':<24}{new_t:>12.3f}")
+        print(f"\nSpeedup: {old_t / new_t:.2f}x")
+        print(f"Packages: {len(new_pkgs)}  Data dirs: {len(new_data)}  Identical: {same}")
+
+        if not same:
+            sys.exit(1)
+
+
+def bench_scan_cache(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"[*] Creating synthetic tree with {args.files} files in {tmp}...")
+        made = make_tree(tmp, args.files)
+        print(f"    {made} files created")
+
+        cache_path = os.path.join(tmp, "build", "scan_cache.json")
+        os.makedirs(os.path.dirname(cache_path))
+
+        # Let the tree age past the racy window so the cache is trusted
+        time.sleep(build.SCAN_CACHE_RACY_NS / 1e9)
+
+        _, expected = timed(build.detect_packages_and_data, tmp, workers=args.workers, repeat=1)
+        cold_t, cold = timed(
+            build.detect_packages_and_data, tmp, workers=args.workers, cache_path=cache_path, repeat=1
+        )
+        warm_t, warm = timed(
+            build.detect_packages_and_data, tmp, workers=args.workers, cache_path=cache_path,
+            repeat=args.repeat,
+        )
+
+        # Touch one data dir and make sure the change is picked up
+        os.makedirs(os.path.join(tmp, "fresh_data"))
+        open(os.path.join(tmp, "fresh_data", "blob.bin"), "w").close()
+        _, changed = timed(build.detect_packages_and_data, tmp, workers=args.workers, repeat=1)
+        incr_t, incr = timed(
+            build.detect_packages_and_data, tmp, workers=args.workers, cache_path=cache_path, repeat=1
+        )
+
+        same = cold == expected and warm == expected and incr == changed
+        print(f"\n{'run':<24}{'best (s)':>12}")
+        print(f"{'cold (no cache)':<24}{cold_t:>12.3f}")
+        print(f"{'warm (no changes)':<24}{warm_t:>12.3f}")
+        print(f"{'warm (one new dir)':<24}{incr_t:>12.3f}")
+        print(f"\nIdentical to uncached scan: {same}")
+
+        if not same:
+            sys.exit(1)
+
+
+def _make_sample_data(root, size_mb, seed=0):
+    """Half text-like, half random data, roughly like a state/ dump."""
+    rng = random.Random(seed)
+    words = [f"token{i}".encode() for i in range(2000)]
+    os.makedirs(root)
+    for i in range(size_mb):
+        with open(os.path.join(root, f"part{i}.bin"), "wb") as f:
+            if i % 2:
+                f.write(rng.randbytes(1024 * 1024))
+            else:
+                f.write(b" ".join(rng.choice(words) for _ in range(130_000))[:1024 * 1024])
+
+
+def bench_compress(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        data = args.data
+        if not os.path.isdir(data):
+            data = os.path.join(tmp, "state")
+            print(f"[*] {args.data} not found, generating {args.size_mb} MB of sample data...")
+            _make_sample_data(data, args.size_mb)
+
+        tar_path = os.path.join(tmp, "payload.tar")
+        with tarfile.open(tar_path, "w") as tar:
+            tar.add(data, arcname="state")
+        total = os.path.getsize(tar_path)
+        print(f"[*] Uncompressed tar: {total / 1e6:.1f} MB, threads: {args.threads or os.cpu_count()}")
+
+        def run(codec, threads):
+            digest = hashlib.sha256()
+            out_size = 0
+            with open(tar_path, "rb") as f:
+                chunks = iter(lambda: f.read(args.chunk_size), b"")
+                for packed in cerberus_payload.parallel_compress(chunks, codec, args.level, threads):
+                    digest.update(packed)
+                    out_size += len(packed)
+            return out_size, digest.hexdigest()
+
+        print(f"\n{'backend':<10}{'level':>6}{'MB/s':>10}{'ratio':>9}{'size (MB)':>12}{'1-thread identical':>20}")
+        for name in ("gzip", "zstd", "xz"):
+            codec = cerberus_payload.CODECS[name]
+            try:
+                cerberus_payload.check_compression(codec)
+            except cerberus_payload.PayloadError as e:
+                print(f"{name:<10}  skipped: {e}")
+                continue
+
+            elapsed, (out_size, digest) = timed(run, codec, args.threads, repeat=1)
+            _, (_, single_digest) = timed(run, codec, 1, repeat=1)
+            level = args.level if args.level is not None else cerberus_payload.DEFAULT_LEVELS[codec]
+            print(
+                f"{name:<10}{level:>6}{total / 1e6 / elapsed:>10.1f}{total / out_size:>9.2f}"
+                f"{out_size / 1e6:>12.1f}{str(digest == single_digest):>20}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark build.py stages")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    scan = sub.add_parser("scan", help="Project scanner vs. the original two-pass walk")
+    scan.add_argument("--files", type=int, default=200_000, help="Files in the synthetic tree (default: 200000)")
+    scan.add_argument("--workers", type=int, default=None, help="Scanner threads")
+    scan.add_argument("--repeat", type=int, default=3, help="Runs per implementation, best is reported")
+    scan.set_defaults(func=bench_scan)
+
+    cache = sub.add_parser("scan-cache", help="Cold vs. warm runs of the cached scanner")
+    cache.add_argument("--files", type=int, default=200_000, help="Files in the synthetic tree (default: 200000)")
+    cache.add_argument("--workers", type=int, default=None, help="Scanner threads")
+    cache.add_argument("--repeat", type=int, default=3, help="Warm runs, best is reported")
+    cache.set_defaults(func=bench_scan_cache)
+
+    comp = sub.add_parser("compress", help="Throughput and ratio of each compression backend")
+    comp.add_argument("--data", default="state", help="Directory to compress (default: state)")
+    comp.add_argument("--size-mb", type=int, default=64, help="Sample size when --data is missing (default: 64)")
+    comp.add_argument("--level", type=int, default=None, help="Compression level (default: backend default)")
+    comp.add_argument("--threads", type=int, default=None, help="Compression threads (default: all cores)")
+    comp.add_argument("--chunk-size", type=int, default=build.ARCH_COMPRESS_CHUNK, help="Bytes per independent chunk")
+    comp.set_defaults(func=bench_compress)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.func(args)
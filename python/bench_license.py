@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+#
+# Author: Crazygiscool
+# Description: Benchmarks for apply_license.py.
+
+import os
+import re
+import time
+import random
+import difflib
+import hashlib
+import argparse
+import tempfile
+
+import apply_license
+
+
+EXTENSIONS = [".py", ".md", ".json", ".yaml"]
+
+FOREIGN_LICENSE = """Copyright (c) 2019 Example Corp
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software.
+Unauthorized use beyond these terms voids the grant."""
+
+
+# -----------------------------
+# SYNTHETIC TREE
+# -----------------------------
+def edit_words(text, rng, edits):
+    words = text.split(" ")
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(["foo", "Acme", "2019", "licence", "permitted"])
+    return " ".join(words)
+
+
+def make_header(ext, rng):
+    """A header as found in the wild: current, edited, someone else's, or none."""
+    kind = rng.random()
+    if kind < 0.6:
+        return apply_license.LICENSE_HEADERS[ext]
+    if kind < 0.75:
+        return edit_words(apply_license.LICENSE_HEADERS[ext], rng, rng.randint(1, 40))
+    if kind < 0.8:
+        style = apply_license.COMMENT_STYLES[ext]
+        return style.format(FOREIGN_LICENSE.replace("\n", "\n" + style.format("")))
+    return None
+
+
+def make_tree(root, n_files, files_per_dir=500, seed=0):
+    rng = random.Random(seed)
+    body = "".join(f"line {i} of the file body\n" for i in range(40))
+    for i in range(n_files):
+        folder = os.path.join(root, f"d{i // files_per_dir}")
+        os.makedirs(folder, exist_ok=True)
+        ext = rng.choice(EXTENSIONS)
+        header = make_header(ext, rng)
+        with open(os.path.join(folder, f"f{i}{ext}"), "w", encoding="utf-8") as f:
+            f.write(f"{header}\n\n{body}" if header else body)
+
+
+def tree_digests(root):
+    digests = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                digests[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+# -----------------------------
+# REFERENCE IMPLEMENTATION
+# -----------------------------
+LEGACY_THRESHOLD = 0.85
+
+
+def legacy_search(text, ext):
+    """The original unanchored search, recompiled with re.DOTALL on every call."""
+    if ext in [".py", ".md"]:
+        pattern = r'(\"\"\"|<!--).*?Copyright.*?Unauthorized use.*?(\"\"\"|-->)'
+    elif ext in [".json"]:
+        pattern = r'(//.*?Copyright.*?Unauthorized use.*?)\n'
+    else:
+        pattern = r'([#;].*?Copyright.*?Unauthorized use.*?)\n'
+    return re.search(pattern, text, flags=re.DOTALL)
+
+
+def legacy_header_is_current(block, ext):
+    """The original difflib comparison, with the header formatted for every call."""
+    new_license = apply_license.format_license(ext)
+    score = difflib.SequenceMatcher(None, block.strip(), new_license.strip()).ratio()
+    return score >= LEGACY_THRESHOLD
+
+
+# -----------------------------
+# BENCHMARKS
+# -----------------------------
+def sweep(root, compare, workers):
+    original = apply_license.header_is_current
+    apply_license.header_is_current = compare
+    try:
+        start = time.perf_counter()
+        counts = apply_license.scan_folder(root, workers=workers)
+        return time.perf_counter() - start, counts
+    finally:
+        apply_license.header_is_current = original
+
+
+def bench_sweep(args):
+    implementations = [("difflib", legacy_header_is_current), ("exact + shingles", apply_license.header_is_current)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"[*] Creating {args.files} files per tree in {tmp}...")
+        roots = {}
+        for name, _ in implementations:
+            roots[name] = os.path.join(tmp, name.split()[0])
+            make_tree(roots[name], args.files)
+
+        print(f"\n{'implementation':<20}{'pass':>8}{'seconds':>10}  outcomes")
+        results = {}
+        for sweep_pass in ("first", "second"):
+            for name, compare in implementations:
+                elapsed, counts = sweep(roots[name], compare, args.workers)
+                results[name, sweep_pass] = (elapsed, counts)
+                summary = ", ".join(f"{outcome} {count}" for outcome, count in sorted(counts.items()))
+                print(f"{name:<20}{sweep_pass:>8}{elapsed:>10.2f}  {summary}")
+
+        for sweep_pass in ("first", "second"):
+            old_t = results["difflib", sweep_pass][0]
+            new_t = results["exact + shingles", sweep_pass][0]
+            print(f"Speedup, {sweep_pass} pass: {old_t / new_t:.2f}x")
+
+        # Only edited headers near the threshold may be judged differently
+        old_tree, new_tree = (tree_digests(root) for root in roots.values())
+        differ = sum(1 for path in old_tree if old_tree[path] != new_tree.get(path))
+        print(f"Files that differ after both passes: {differ} ({differ / args.files:.2%})")
+
+
+def bench_agreement(args):
+    """How often the shingle score lands on the same side of the threshold as difflib."""
+    rng = random.Random(args.seed)
+    agree = 0
+    disagreements = []
+    compare_t = {"difflib": 0.0, "shingles": 0.0}
+
+    for _ in range(args.samples):
+        ext = rng.choice(EXTENSIONS)
+        header = apply_license.LICENSE_HEADERS[ext]
+        block = edit_words(header, rng, rng.randint(0, 80))
+
+        start = time.perf_counter()
+        old = difflib.SequenceMatcher(None, block.strip(), header.strip()).ratio()
+        compare_t["difflib"] += time.perf_counter() - start
+        start = time.perf_counter()
+        new = apply_license.similarity(block, header)
+        compare_t["shingles"] += time.perf_counter() - start
+
+        if (old >= LEGACY_THRESHOLD) == (new >= apply_license.SIMILARITY_THRESHOLD):
+            agree += 1
+        else:
+            disagreements.append((old, new))
+
+    print(f"Samples: {args.samples}, same decision: {agree / args.samples:.2%}")
+    for name, seconds in compare_t.items():
+        print(f"  {name:<10}{seconds / args.samples * 1e6:>10.1f} us per comparison")
+    for old, new in sorted(disagreements)[:args.show]:
+        print(f"  difflib {old:.3f}  shingles {new:.3f}")
+
+
+def pathological_inputs(size):
+    """Headerless files that make an unanchored lazy search backtrack over the whole text."""
+    units = {
+        ".json": (".json", '{"href":"http://example.com/Copyright"},'),
+        ".md": (".md", "<!-- Copyright notice pending -->\n"),
+        ".py": (".py", '"""Copyright ' + "x " * 8),
+        ".yaml": (".yaml", "# Copyright holder: tbd\n"),
+    }
+    for name, (ext, unit) in units.items():
+        yield name, ext, unit * (size // len(unit) + 1)
+
+
+def time_match(match, text, ext):
+    start = time.perf_counter()
+    found = match(text, ext)
+    return time.perf_counter() - start, found
+
+
+def bench_pathological(args):
+    print(f"{'input':<8}{'chars':>12}{'legacy s':>12}{'anchored s':>12}")
+    worst = 0.0
+    for size in args.sizes + [args.large]:
+        for name, ext, text in pathological_inputs(size):
+            legacy = "-"
+            if size in args.sizes:
+                elapsed, found = time_match(legacy_search, text, ext)
+                legacy = f"{elapsed:.4f}"
+                assert found is None
+            elapsed, found = time_match(apply_license.match_license, text, ext)
+            assert found is None
+            worst = max(worst, elapsed)
+            print(f"{name:<8}{len(text):>12}{legacy:>12}{elapsed:>12.6f}")
+
+    # A real header in front of the same junk must still be found, and quickly
+    for name, ext, text in pathological_inputs(args.large):
+        elapsed, found = time_match(apply_license.match_license, apply_license.LICENSE_HEADERS[ext] + "\n\n" + text, ext)
+        assert found and apply_license.header_is_current(found.group("block"), ext), name
+        worst = max(worst, elapsed)
+
+    print(f"Slowest anchored match: {worst * 1000:.3f} ms (budget {args.budget * 1000:.0f} ms)")
+    if worst > args.budget:
+        raise SystemExit("Anchored match exceeded its budget")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark apply_license.py")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    sweep_cmd = sub.add_parser("sweep", help="Full sweep with difflib vs. exact match + shingles")
+    sweep_cmd.add_argument("--files", type=int, default=50_000, help="Files in each synthetic tree (default: 50000)")
+    sweep_cmd.add_argument("--workers", type=int, default=1, help="Processes for scan_folder (default: 1)")
+    sweep_cmd.set_defaults(func=bench_sweep)
+
+    agree = sub.add_parser("agreement", help="Decisions of the shingle score vs. difflib on edited headers")
+    agree.add_argument("--samples", type=int, default=2000, help="Edited headers to score (default: 2000)")
+    agree.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    agree.add_argument("--show", type=int, default=10, help="Disagreements listed (default: 10)")
+    agree.set_defaults(func=bench_agreement)
+
+    patho = sub.add_parser("pathological", help="Header matching on adversarial inputs, legacy vs. anchored")
+    patho.add_argument("--sizes", type=int, nargs="+", default=[2_000, 4_000, 8_000],
+                       help="Input sizes in characters for both implementations (default: 2000 4000 8000)")
+    patho.add_argument("--large", type=int, default=50_000_000,
+                       help="Size of the extra input matched by the anchored regex only (default: 50000000)")
+    patho.add_argument("--budget", type=float, default=0.05,
+                       help="Seconds an anchored match may take at any size (default: 0.05)")
+    patho.set_defaults(func=bench_pathological)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.func(args)
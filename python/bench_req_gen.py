@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# Author: Crazygiscool
+# Description: Benchmarks and cross-checks for req_gen.py.
+
+import os
+import sys
+import time
+import argparse
+import builtins
+import sysconfig
+from importlib.metadata import version, PackageNotFoundError, packages_distributions
+
+import req_gen
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+def collect_sources(roots):
+    """Read every .py file under roots, skipping files that are not UTF-8."""
+    sources = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in (".git", "__pycache__")]
+            for name in filenames:
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path, "rb") as f:
+                        sources.append((path, f.read().decode("utf-8")))
+                except (OSError, UnicodeDecodeError):
+                    pass
+    return sources
+
+
+def run_extractor(fn, sources):
+    """Returns (seconds, {path: imports or the exception})."""
+    results = {}
+    start = time.perf_counter()
+    for path, source in sources:
+        try:
+            results[path] = fn(source, path)
+        except Exception as e:
+            results[path] = e
+    return time.perf_counter() - start, results
+
+
+# -----------------------------
+# REFERENCE IMPLEMENTATION
+# -----------------------------
+def legacy_resolve_versions(import_sources):
+    """The original per-import version() lookup, kept for comparison."""
+    resolved = {}
+    stdlib_modules = set(sys.builtin_module_names) | set(dir(builtins))
+
+    for package in import_sources:
+        if package in stdlib_modules:
+            continue
+        try:
+            pkg_version = version(package)
+            resolved[package] = {
+                "line": f"{package}=={pkg_version}",
+                "sources": import_sources[package]
+            }
+        except PackageNotFoundError:
+            pass
+    return resolved
+
+
+# -----------------------------
+# BENCHMARKS
+# -----------------------------
+def bench_extract(args):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    roots = args.roots or [repo, sysconfig.get_paths()["stdlib"]]
+    sources = collect_sources(roots)
+    total = sum(len(source) for _, source in sources)
+    print(f"[*] {len(sources)} files, {total / 1e6:.1f} MB from {', '.join(roots)}")
+
+    ast_t, ast_results = run_extractor(req_gen.parse_imports, sources)
+    scan_t, scan_results = run_extractor(req_gen.parse_imports_fast, sources)
+    fallbacks = sum(1 for _, source in sources if req_gen.scan_imports(source) is None)
+
+    print(f"\n{'extractor':<24}{'seconds':>10}{'MB/s':>10}")
+    print(f"{'ast':<24}{ast_t:>10.3f}{total / 1e6 / ast_t:>10.1f}")
+    print(f"{'scan':<24}{scan_t:>10.3f}{total / 1e6 / scan_t:>10.1f}")
+    print(f"\nSpeedup: {ast_t / scan_t:.2f}x, AST fallbacks: {fallbacks} ({fallbacks / len(sources):.1%})")
+
+    # Files the AST cannot parse have no reference result; the scanner
+    # still reports their imports, so they are listed apart from real mismatches
+    unparsable = [path for path, result in ast_results.items() if isinstance(result, Exception)]
+    mismatches = [
+        path for path, result in ast_results.items()
+        if not isinstance(result, Exception) and scan_results[path] != result
+    ]
+
+    print(f"Files the AST cannot parse (excluded): {len(unparsable)}")
+    for path in unparsable[:args.show]:
+        print(f"    {path}")
+    print(f"Mismatches: {len(mismatches)}")
+    for path in mismatches[:args.show]:
+        only_ast = sorted(ast_results[path] - scan_results[path])
+        only_scan = sorted(scan_results[path] - ast_results[path])
+        print(f"    {path}: ast only {only_ast}, scan only {only_scan}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+def bench_resolve(args):
+    req_gen.configure_logging("ERROR")
+
+    # Every installed top-level name, the whole stdlib and some first-party names
+    names = set(packages_distributions()) | set(sys.stdlib_module_names)
+    names |= {f"local_module_{i}" for i in range(args.local)}
+    import_sources = {name: {"main.py"} for name in sorted(names)}
+    print(f"[*] Resolving {len(import_sources)} import names")
+
+    old_t = time.perf_counter()
+    old = legacy_resolve_versions(import_sources)
+    old_t = time.perf_counter() - old_t
+
+    index_t = time.perf_counter()
+    index = req_gen.build_distribution_index()
+    index_t = time.perf_counter() - index_t
+
+    new_t = time.perf_counter()
+    new = req_gen.resolve_versions(import_sources, index)
+    new_t = time.perf_counter() - new_t
+
+    stdlib_calls = sum(1 for name in import_sources if name in req_gen.STDLIB_MODULES and name not in old)
+    print(f"\n{'implementation':<24}{'seconds':>10}{'resolved':>10}")
+    print(f"{'version() per import':<24}{old_t:>10.3f}{len(old):>10}")
+    print(f"{'index build':<24}{index_t:>10.3f}")
+    print(f"{'index lookups':<24}{new_t:>10.3f}{len(new):>10}")
+    print(f"\nSpeedup: {old_t / (index_t + new_t):.1f}x")
+    print(f"Stdlib names the old check sent to version(): {stdlib_calls}")
+
+    # Distributions whose name differs from the import name were missed before
+    old_names = {entry["line"].split("==")[0].lower() for entry in old.values()}
+    renamed = sorted(name for name in new if name.lower() not in old_names)
+    print(f"Distributions only found via the index: {renamed[:args.show] or 'none'}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark req_gen.py stages")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    extract = sub.add_parser("extract", help="AST vs. scanning import extractor: speed and identical results")
+    extract.add_argument(
+        "roots", nargs="*",
+        help="Directories to read .py files from (default: this repository and the standard library)",
+    )
+    extract.add_argument("--show", type=int, default=20, help="Paths listed per category (default: 20)")
+    extract.set_defaults(func=bench_extract)
+
+    resolve = sub.add_parser("resolve", help="Per-import version() calls vs. the distribution index")
+    resolve.add_argument("--local", type=int, default=200, help="Unresolvable first-party names to add (default: 200)")
+    resolve.add_argument("--show", type=int, default=20, help="Names listed (default: 20)")
+    resolve.set_defaults(func=bench_resolve)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.func(args)
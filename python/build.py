@@ -16,6 +16,17 @@ from pathlib import Path
 from pathspec import PathSpec # type: ignore
 from cryptography.fernet import Fernet # type: ignore
 
+from cerberus_payload import (
+    StreamWriter,
+    ArchiveWriter,
+    PayloadError,
+    CODECS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_BLOCK_SIZE,
+    check_compression,
+    parallel_compress,
+)
+
 # -----------------------------
 # CONFIGURATION
 # -----------------------------
@@ -45,6 +56,38 @@ IGNORE_DIRS = {
 # Data dirs you always want bundled (runtime will expect them)
 CORE_DATA_ROOTS = ["state"]  # "core" is code, not data, so not here
 
+# Compression used when --compress is not given
+DEFAULT_PAYLOAD_COMPRESSION = "gzip"
+DEFAULT_ARCH_COMPRESSION = "zstd"
+
+# Arch package suffix for each --compress backend
+ARCH_PKG_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "xz": ".xz"}
+
+# Size of the independently compressed pieces of the Arch package
+ARCH_COMPRESS_CHUNK = 8 * 1024 * 1024
+
+# Cached toolchain probe results (keyed on PATH and executable mtimes)
+TOOLCHAIN_CACHE_PATH = os.path.join("build", "toolchain_cache.json")
+
+# Fingerprint of the last successful compile, stored next to the binary
+FINGERPRINT_PATH = os.path.join("build", f"{OUTPUT_NAME}.fingerprint.json")
+
+# Per-phase timings of the last compile, stored next to the binary
+TIMELINE_PATH = os.path.join("build", f"{OUTPUT_NAME}.timeline.json")
+
+# Per-phase build profile (time, peak RSS, bytes written), JSON + CSV
+PROFILE_PATH = os.path.join("build", f"{OUTPUT_NAME}.profile.json")
+PROFILE_CSV_PATH = os.path.join("build", f"{OUTPUT_NAME}.profile.csv")
+
+# Slowdown (fraction) that --compare flags as a regression
+PROFILE_REGRESSION_THRESHOLD = 0.10
+
+# Nuitka's download + ccache dir for --incremental builds
+NUITKA_CACHE_DIR = os.path.join("build", "nuitka-cache")
+
+# Auto-detection cache (dir mtimes + scan results), reused between builds
+SCAN_CACHE_PATH = os.path.join("build", "scan_cache.json")
+
 
 # -----------------------------
 # ARGUMENTS
@@ -56,6 +99,31 @@ def parse_args():
         action="store_true",
         help="Encrypt bundled data payload after build",
     )
+    parser.add_argument(
+        "--payload-format",
+        choices=["archive", "stream"],
+        default="archive",
+        help="Encrypted payload layout: random-access archive or streamed tar (default: archive)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sorted(ARCH_PKG_EXTENSIONS),
+        default=None,
+        help=f"Compression backend for the data payload and Arch package "
+             f"(default: {DEFAULT_PAYLOAD_COMPRESSION} for payload, {DEFAULT_ARCH_COMPRESSION} for Arch)",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=None,
+        help="Compression level (default: backend default)",
+    )
+    parser.add_argument(
+        "--compress-threads",
+        type=int,
+        default=None,
+        help="Threads used for compression (default: all cores)",
+    )
     parser.add_argument(
         "--upx",
         action="store_true",
@@ -72,67 +140,290 @@ def parse_args():
         help="Stream Nuitka output live (stdout + stderr)"
     )
 
+    parser.add_argument(
+        "--scan-workers",
+        type=int,
+        default=None,
+        help="Threads used to scan the project tree (default: ThreadPoolExecutor default)",
+    )
+
+    parser.add_argument(
+        "--no-scan-cache",
+        action="store_true",
+        help=f"Ignore and do not update the auto-detection cache ({SCAN_CACHE_PATH})",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep Nuitka's build directory and C compiler cache between runs",
+    )
+    parser.add_argument(
+        "--force-rebuild",
+        action="store_true",
+        help="Compile even if the build fingerprint matches the previous build",
+    )
+
+    parser.add_argument(
+        "--compare",
+        metavar="PROFILE_JSON",
+        default=None,
+        help=f"Diff this build's timing report against a previous {PROFILE_PATH}",
+    )
+
+    parser.add_argument(
+        "--refresh-toolchain",
+        action="store_true",
+        help=f"Probe compilers and tools again instead of using {TOOLCHAIN_CACHE_PATH}",
+    )
+
     parser.add_argument( "--torch-jit", choices=["auto", "enable", "disable"], default="disable", help="Control Nuitka Torch JIT mode (default: disable)" )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.encrypt_data:
+        # The payload is built after Nuitka, too late to find out its codec is missing
+        try:
+            check_compression(CODECS[compression_settings(args, DEFAULT_PAYLOAD_COMPRESSION)[0]])
+        except PayloadError as e:
+            parser.error(f"--encrypt-data: {e}")
+    return args
 
 
 # -----------------------------
-# AUTO-DETECTION
+# PROJECT SCANNER
 # -----------------------------
-def detect_packages_and_data(root="."):
-    packages = []
-    data_dirs = []
-
+def load_gitignore_spec(root="."):
     gitignore_path = os.path.join(root, ".gitignore")
     if os.path.exists(gitignore_path):
         with open(gitignore_path, "r", encoding="utf-8", errors="ignore") as f:
-            gitignore_spec = PathSpec.from_lines("gitwildmatch", f)
-    else:
-        gitignore_spec = PathSpec.from_lines("gitwildmatch", [])
+            return PathSpec.from_lines("gitwildmatch", f)
+    return PathSpec.from_lines("gitwildmatch", [])
 
-    all_packages = set()
 
-    for dirpath, dirnames, filenames in os.walk(root):
-        rel_path = os.path.relpath(dirpath, root)
+def _scan_dir(path):
+    """
+    List a single directory with os.scandir.
 
-        if rel_path == ".":
-            continue
+    Returns (has_init, has_non_py, subdirs) or None if the directory could
+    not be read. Symlinked directories are not descended into, matching
+    os.walk's default.
+    """
+    has_init = False
+    has_non_py = False
+    subdirs = []
 
-        folder = os.path.basename(dirpath)
-        if folder in IGNORE_DIRS:
-            dirnames[:] = []
-            continue
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                    continue
+
+                if entry.name == "__init__.py":
+                    has_init = True
+                elif not entry.name.endswith(".py"):
+                    has_non_py = True
+    except OSError:
+        return None
+
+    return has_init, has_non_py, subdirs
+
+
+def _scan_or_reuse(path, cached):
+    """
+    Stat a directory and reuse its cached record when the mtime still
+    matches, otherwise list it again.
+
+    Returns (mtime_ns, reused, scan_result) or None if unreadable.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    if cached is not None and cached[0] == mtime:
+        return mtime, True, None
+
+    result = _scan_dir(path)
+    if result is None:
+        return None
+    return mtime, False, result
+
+
+def _is_pruned(name, rel_path, gitignore_spec):
+    return name in IGNORE_DIRS or gitignore_spec.match_file(rel_path)
+
+
+def scan_project(root=".", gitignore_spec=None, workers=None, cache=None, stats=None):
+    """
+    Walk the project tree once, one level at a time, listing each level's
+    directories concurrently in a thread pool.
+
+    Ignored directories (IGNORE_DIRS or .gitignore) are pruned before they
+    are listed, so nothing below them is ever touched.
+
+    If cache (a previous result of this function) is given, directories
+    whose mtime has not changed are only stat'ed, not listed.
+
+    Returns a dict mapping relative dir path ("" for root) to
+    [mtime_ns, has_init, has_non_py, subdirs], where subdirs keeps scandir
+    order and only contains directories that were not pruned.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if gitignore_spec is None:
+        gitignore_spec = load_gitignore_spec(root)
+    if cache is None:
+        cache = {}
+    if stats is None:
+        stats = {}
+    stats.setdefault("reused", 0)
+    stats.setdefault("scanned", 0)
+
+    tree = {}
+    level = [""]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            paths = [os.path.join(root, rel) if rel else root for rel in level]
+            cached = [cache.get(rel) for rel in level]
+            next_level = []
+
+            for rel, prev, result in zip(level, cached, pool.map(_scan_or_reuse, paths, cached)):
+                if result is None:
+                    continue
+
+                mtime, reused, scanned = result
+                if reused:
+                    stats["reused"] += 1
+                    tree[rel] = prev
+                    next_level.extend(f"{rel}/{name}" if rel else name for name in prev[3])
+                    continue
+
+                stats["scanned"] += 1
+                has_init, has_non_py, subdirs = scanned
+                kept = []
+                for name in subdirs:
+                    child = f"{rel}/{name}" if rel else name
+                    if _is_pruned(name, child, gitignore_spec):
+                        continue
+                    kept.append(name)
+                    next_level.append(child)
+
+                tree[rel] = [mtime, has_init, has_non_py, kept]
+
+            level = next_level
+
+    return tree
+
+
+# -----------------------------
+# SCAN CACHE
+# -----------------------------
+SCAN_CACHE_VERSION = 1
+
+# A directory modified this close to the scan can change again within the
+# same mtime tick, so its entry is saved with mtime 0 and rescanned next run
+SCAN_CACHE_RACY_NS = 2_000_000_000
 
-        if gitignore_spec.match_file(rel_path):
-            dirnames[:] = []
-            continue
 
-        if "__init__.py" in filenames:
-            all_packages.add(rel_path.replace("\\", "/"))
+def _scan_cache_key(root):
+    import hashlib
 
-    for pkg in all_packages:
+    h = hashlib.sha256()
+    h.update(f"v{SCAN_CACHE_VERSION}\n".encode())
+    h.update("\n".join(sorted(IGNORE_DIRS)).encode())
+    h.update(b"\0")
+
+    gitignore_path = os.path.join(root, ".gitignore")
+    if os.path.exists(gitignore_path):
+        with open(gitignore_path, "rb") as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+
+def load_scan_cache(root, cache_path):
+    """
+    Load the cached scan tree, or {} if it is missing, unreadable, or was
+    written for a different .gitignore / IGNORE_DIRS.
+    """
+    import json
+
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get("key") != _scan_cache_key(root):
+        return {}
+    return data.get("tree", {})
+
+
+def save_scan_cache(root, cache_path, tree, started_ns):
+    import json
+    import time
+
+    cutoff = started_ns - SCAN_CACHE_RACY_NS
+    safe_tree = {}
+    for rel, entry in tree.items():
+        if entry[0] >= cutoff:
+            entry = [0] + entry[1:]
+        safe_tree[rel] = entry
+
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"key": _scan_cache_key(root), "created": time.time(), "tree": safe_tree}, f)
+    os.replace(tmp_path, cache_path)
+
+
+# -----------------------------
+# AUTO-DETECTION
+# -----------------------------
+def detect_packages_and_data(root=".", workers=None, cache_path=None):
+    import time
+
+    packages = []
+    data_dirs = []
+
+    cache = load_scan_cache(root, cache_path) if cache_path else {}
+    stats = {}
+    started_ns = time.time_ns()
+
+    tree = scan_project(root, workers=workers, cache=cache, stats=stats)
+
+    if cache_path:
+        save_scan_cache(root, cache_path, tree, started_ns)
+        if DEBUG:
+            print(f"   Scan cache: {stats['reused']} dirs reused, {stats['scanned']} rescanned")
+
+    all_packages = {rel for rel, entry in tree.items() if rel and entry[1]}
+
+    for pkg in sorted(all_packages):
         parent = os.path.dirname(pkg)
-        if parent == "" or parent == "." or parent not in all_packages:
+        if parent == "" or parent not in all_packages:
             packages.append(pkg)
 
-    for dirpath, dirnames, filenames in os.walk(root):
-        rel_path = os.path.relpath(dirpath, root)
-        if rel_path == ".":
+    # Emit data dirs in top-down walk order, same as os.walk would
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        if rel not in tree:
             continue
 
-        folder = os.path.basename(dirpath)
-        if folder in IGNORE_DIRS:
-            dirnames[:] = []
-            continue
+        has_non_py, subdirs = tree[rel][2], tree[rel][3]
+        if rel and has_non_py:
+            data_dirs.append(rel)
 
-        if gitignore_spec.match_file(rel_path):
-            dirnames[:] = []
-            continue
-
-        has_non_py = any(not f.endswith(".py") for f in filenames)
-        if has_non_py:
-            data_dirs.append(rel_path.replace("\\", "/"))
+        stack.extend(f"{rel}/{name}" if rel else name for name in reversed(subdirs))
 
     return packages, data_dirs
 
@@ -140,7 +431,14 @@ def detect_packages_and_data(root="."):
 # -----------------------------
 # BUILD COMMAND GENERATION
 # -----------------------------
-def build_command(packages, data_dirs, args):
+def build_command(packages, data_dirs, args, toolchain=None):
+    """
+    Generate the Nuitka command line.
+
+    With a toolchain (from discover_toolchain) the compiler and onefile
+    compression flags follow what is actually installed; without one the
+    historical defaults (clang, compression on --upx) are used.
+    """
     system = platform.system().lower()
 
     cmd = [
@@ -161,18 +459,26 @@ def build_command(packages, data_dirs, args):
         "--noinclude-pytest-mode=nofollow",
         "--noinclude-setuptools-mode=nofollow",
         "--noinclude-unittest-mode=nofollow",
-        "--remove-output",
         "--assume-yes-for-downloads",
     ]
 
+    # Incremental builds keep Nuitka's build dir so only changed modules recompile
+    if not args.incremental:
+        cmd.append("--remove-output")
+
     if system == "windows":
         cmd.append("--msvc=latest")
     else:
-        cmd.append("--clang")
+        # Nuitka uses gcc unless told otherwise; prefer clang when it is there
+        if toolchain is None or toolchain["tools"].get("clang"):
+            cmd.append("--clang")
         cmd.append("--static-libpython=no")
 
         if args.upx:
-            cmd.append("--onefile-compression=yes")
+            if toolchain is None or toolchain["zstandard"]:
+                cmd.append("--onefile-compression=yes")
+            if toolchain is not None and toolchain["tools"].get("upx"):
+                cmd.append("--enable-plugin=upx")
 
     # Torch JIT handling
     if args.torch_jit == "disable":
@@ -201,36 +507,304 @@ def build_command(packages, data_dirs, args):
     return cmd
 
 
+# -----------------------------
+# TOOLCHAIN DISCOVERY
+# -----------------------------
+TOOLCHAIN_TOOLS = ["upx", "clang", "gcc", "patchelf", "ccache", "dpkg-deb", "tar"]
+TOOLCHAIN_CACHE_VERSION = 1
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _nuitka_location():
+    from importlib.util import find_spec
+
+    spec = find_spec("nuitka")
+    if spec is None or spec.origin is None:
+        return None
+    return os.path.dirname(os.path.dirname(spec.origin))
+
+
+def _probe_nuitka():
+    """Nuitka version from package metadata; only spawn Python if that is missing."""
+    version = _nuitka_version()
+    if version != "unknown":
+        return version
+    if _nuitka_location() is None:
+        return None
+
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "nuitka", "--version"], capture_output=True, text=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    lines = result.stdout.strip().splitlines()
+    return lines[0].strip() if result.returncode == 0 and lines else None
+
+
+def _probe_zstandard():
+    from importlib.util import find_spec
+
+    return find_spec("zstandard") is not None
+
+
+def _toolchain_key(tools):
+    """
+    Everything a cached probe depends on: PATH and its directories' mtimes
+    (tools added or removed), the found executables' mtimes (upgraded in
+    place), the interpreter, and where Nuitka is installed.
+    """
+    path_dirs = [p for p in os.environ.get("PATH", "").split(os.pathsep) if p]
+    nuitka_dir = _nuitka_location()
+    return {
+        "version": TOOLCHAIN_CACHE_VERSION,
+        "path": {p: _mtime_ns(p) for p in path_dirs},
+        "executables": {
+            p: _mtime_ns(p) for p in [sys.executable, *(t for t in tools.values() if t)]
+        },
+        "nuitka_dir": [nuitka_dir, _mtime_ns(nuitka_dir) if nuitka_dir else None],
+    }
+
+
+def discover_toolchain(cache_path=None, refresh=False):
+    """
+    Find Nuitka, compilers and packaging tools, probing them concurrently.
+
+    Results are cached in cache_path and reused while PATH, the PATH
+    directories and the executables found are unchanged; refresh=True
+    ignores the cached copy and stores a new one.
+
+    Returns {"python", "nuitka", "zstandard", "tools": {name: path or None}}.
+    """
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    if cache_path and not refresh:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached["key"] == _toolchain_key(cached["toolchain"]["tools"]):
+                return cached["toolchain"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    with ThreadPoolExecutor(max_workers=len(TOOLCHAIN_TOOLS) + 2) as pool:
+        nuitka = pool.submit(_probe_nuitka)
+        zstandard = pool.submit(_probe_zstandard)
+        found = dict(zip(TOOLCHAIN_TOOLS, pool.map(shutil.which, TOOLCHAIN_TOOLS)))
+
+    toolchain = {
+        "python": sys.executable,
+        "nuitka": nuitka.result(),
+        "zstandard": zstandard.result(),
+        "tools": found,
+    }
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"key": _toolchain_key(found), "toolchain": toolchain}, f, indent=2)
+
+    return toolchain
+
+
+def toolchain_problems(toolchain):
+    """Things that would make Nuitka fail late, reported before compiling."""
+    problems = []
+    if toolchain["nuitka"] is None:
+        problems.append(f"Nuitka is not installed for {sys.executable}")
+
+    if platform.system().lower() != "windows":
+        tools = toolchain["tools"]
+        if not tools.get("clang") and not tools.get("gcc"):
+            problems.append("No C compiler found (need clang or gcc)")
+        if platform.system().lower() == "linux" and not tools.get("patchelf"):
+            problems.append("patchelf not found (required for --standalone on Linux)")
+
+    return problems
+
+
+# -----------------------------
+# BUILD FINGERPRINT
+# -----------------------------
+def _nuitka_version():
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        return version("nuitka")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _installed_distributions():
+    """Sorted (name, version) of every installed distribution; --follow-imports compiles them in."""
+    from importlib.metadata import distributions
+
+    return sorted({(dist.name.lower(), dist.version) for dist in distributions() if dist.name})
+
+
+def _hash_file(h, path):
+    h.update(path.replace("\\", "/").encode() + b"\0")
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    h.update(b"\0")
+
+
+def _walk_sorted(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORE_DIRS)
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+
+def compute_build_fingerprint(cmd, packages):
+    """
+    Hash everything that can change the compiled binary.
+
+    - Entry point and top-level modules next to it, plus every .py file of
+      the detected packages (by content).
+    - Bundled data dirs from the command line (by path, size and mtime, so
+      multi-GB state/ trees are not read).
+    - The generated command line, the Python version, the Nuitka version
+      and the name and version of every installed distribution, since
+      third-party imports are compiled in from site-packages.
+    """
+    import hashlib
+    import json
+
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "python": sys.version,
+        "nuitka": _nuitka_version(),
+        "distributions": _installed_distributions(),
+        "command": cmd,
+    }, sort_keys=True).encode())
+
+    sources = {ENTRY} | {
+        name for name in os.listdir(".") if name.endswith(".py") and os.path.isfile(name)
+    }
+    for path in sorted(sources):
+        if os.path.exists(path):
+            _hash_file(h, path)
+
+    for pkg in sorted(packages):
+        for path in _walk_sorted(pkg):
+            if path.endswith(".py"):
+                _hash_file(h, path)
+
+    data_dirs = [arg.split("=", 2)[1] for arg in cmd if arg.startswith("--include-data-dir=")]
+    for src in _top_level_dirs(data_dirs):
+        for path in _walk_sorted(src):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Dangling symlink, or removed during the walk
+                h.update(f"{path}\0missing\0".encode())
+                continue
+            h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+
+    return h.hexdigest()
+
+
+def find_executable():
+    exe_path = os.path.join("build", OUTPUT_NAME)
+    if not os.path.exists(exe_path):
+        candidate = Path("build") / (OUTPUT_NAME + ".bin")
+        if candidate.exists():
+            exe_path = str(candidate)
+    return exe_path
+
+
+def fingerprint_matches(fingerprint):
+    """True if the last successful build had this fingerprint and its binary still exists."""
+    import json
+
+    try:
+        with open(FINGERPRINT_PATH, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return previous.get("fingerprint") == fingerprint and os.path.exists(find_executable())
+
+
+def write_fingerprint(fingerprint):
+    import json
+
+    with open(FINGERPRINT_PATH, "w", encoding="utf-8") as f:
+        json.dump({
+            "fingerprint": fingerprint,
+            "python": sys.version,
+            "nuitka": _nuitka_version(),
+        }, f, indent=2)
+
+
 # -----------------------------
 # DATA ENCRYPTION
 # -----------------------------
-def build_encrypted_payload(data_dirs, key, output_path):
+def compression_settings(args, default):
+    """Return (codec, level, threads) for a target, honouring --compress*."""
+    codec = args.compress or default
+    return codec, args.compress_level, args.compress_threads
+
+
+def build_encrypted_payload(data_dirs, key, output_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                            compress=(DEFAULT_PAYLOAD_COMPRESSION, None, None)):
     """
     Create a single encrypted payload from selected data directories.
 
-    - Packs data_dirs into a tar-like structure in memory.
-    - Encrypts with Fernet (symmetric).
-    - Writes to output_path.
+    - Streams data_dirs through tar.
+    - Cuts the tar stream into chunk_size pieces, compresses them in
+      parallel and encrypts each one (AES-GCM) straight to output_path,
+      see cerberus_payload.py.
+    - Memory use is bounded by chunk_size * threads, not by the payload size.
     """
     import tarfile
-    import io
 
-    buf = io.BytesIO()
-
-    # Pack into tar in memory
-    with tarfile.open(mode="w:gz", fileobj=buf) as tar:
-        for d in data_dirs:
-            if os.path.isdir(d):
-                tar.add(d, arcname=d)
+    codec, level, threads = compress
+    check_compression(CODECS[codec])
+    with open(output_path, "wb") as f_out:
+        with StreamWriter(f_out, key, chunk_size, CODECS[codec], level, threads) as writer:
+            with tarfile.open(mode="w|", fileobj=writer) as tar:
+                # tar.add() recurses, so nested selections would be stored twice
+                for d in _top_level_dirs(data_dirs):
+                    if os.path.isdir(d):
+                        tar.add(d, arcname=d)
 
-    buf.seek(0)
-    raw = buf.read()
 
-    f = Fernet(key)
-    encrypted = f.encrypt(raw)
+def build_encrypted_archive(data_dirs, key, output_path, block_size=DEFAULT_BLOCK_SIZE,
+                            compress=(DEFAULT_PAYLOAD_COMPRESSION, None, None)):
+    """
+    Create a random-access encrypted archive from selected data directories.
 
+    - Every file is split into block_size blocks, each compressed and
+      encrypted on its own, followed by an encrypted table of contents.
+    - The runtime can open single members without decrypting the rest,
+      see cerberus_payload.open_archive.
+    """
+    codec, level, threads = compress
+    check_compression(CODECS[codec])
     with open(output_path, "wb") as f_out:
-        f_out.write(encrypted)
+        with ArchiveWriter(f_out, key, block_size, CODECS[codec], level, threads) as archive:
+            for d in _top_level_dirs(data_dirs):
+                if os.path.isdir(d):
+                    archive.add_dir(d, d)
+
+
+def _top_level_dirs(dirs):
+    """Drop entries that live under another entry, the walk covers them."""
+    kept = []
+    for d in sorted(dirs):
+        if not any(d.startswith(k + "/") for k in kept):
+            kept.append(d)
+    return kept
 
 
 def encrypt_data_payload(args, data_dirs):
@@ -239,7 +813,8 @@ def encrypt_data_payload(args, data_dirs):
 
     Runtime responsibility:
     - Read key from env / config / hardware
-    - Decrypt payload at startup
+    - Open payload at startup (cerberus_payload.open_archive, or extract_payload
+      for --payload-format=stream)
     """
     print("[*] Building encrypted data payload...")
 
@@ -255,7 +830,11 @@ def encrypt_data_payload(args, data_dirs):
 
     key = Fernet.generate_key()
     payload_path = os.path.join("build", "cerberus_data.enc")
-    build_encrypted_payload(selected_dirs, key, payload_path)
+    compress = compression_settings(args, DEFAULT_PAYLOAD_COMPRESSION)
+    if args.payload_format == "archive":
+        build_encrypted_archive(selected_dirs, key, payload_path, compress=compress)
+    else:
+        build_encrypted_payload(selected_dirs, key, payload_path, compress=compress)
 
     key_path = os.path.join("build", "cerberus_data.key")
     with open(key_path, "wb") as f:
@@ -267,31 +846,62 @@ def encrypt_data_payload(args, data_dirs):
     print("    Integrate secure key management in runtime before using this in prod.")
 
 
+# -----------------------------
+# SHARED STAGING
+# -----------------------------
+def _link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a real copy across filesystems."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def stage_package_tree(exe_path, data_dirs, staging_root):
+    """
+    Lay out usr/bin/cerberus and usr/share/cerberus/<data> once.
+
+    Files are hardlinked from the project where the filesystem allows it,
+    so staging a multi-GB state/ tree costs one link per file, not a copy.
+    """
+    bin_dir = os.path.join(staging_root, "usr", "bin")
+    share_dir = os.path.join(staging_root, "usr", "share", "cerberus")
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(share_dir, exist_ok=True)
+
+    _link_or_copy(exe_path, os.path.join(bin_dir, "cerberus"))
+
+    selected = [
+        d for d in data_dirs
+        if any(d == root or d.startswith(root + "/") for root in CORE_DATA_ROOTS)
+    ]
+    for d in _top_level_dirs(selected):
+        if os.path.isdir(d):
+            shutil.copytree(
+                d, os.path.join(share_dir, d), copy_function=_link_or_copy, dirs_exist_ok=True
+            )
+
+
+def _populate_pkg_root(pkg_root, exe_path, data_dirs, staging=None):
+    """Fill a package root from the shared staging tree, or stage from scratch."""
+    if staging is None:
+        stage_package_tree(exe_path, data_dirs, pkg_root)
+    else:
+        shutil.copytree(staging, pkg_root, copy_function=_link_or_copy)
+
+
 # -----------------------------
 # .DEB PACKAGING
 # -----------------------------
-def build_deb(exe_path, data_dirs, version):
+def build_deb(exe_path, data_dirs, version, staging=None):
     if shutil.which("dpkg-deb") is None:
         print("[!] dpkg-deb not found, skipping .deb packaging.")
         return
 
     print("[*] Building .deb package...")
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(staging) if staging else None) as tmpdir:
         deb_root = os.path.join(tmpdir, "cerberus")
-        bin_dir = os.path.join(deb_root, "usr", "bin")
-        share_dir = os.path.join(deb_root, "usr", "share", "cerberus")
-
-        os.makedirs(bin_dir, exist_ok=True)
-        os.makedirs(share_dir, exist_ok=True)
-
-        shutil.copy2(exe_path, os.path.join(bin_dir, "cerberus"))
-
-        for d in data_dirs:
-            if any(d == root or d.startswith(root + "/") for root in CORE_DATA_ROOTS):
-                src = d
-                dst = os.path.join(share_dir, d)
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst, dirs_exist_ok=True)
+        _populate_pkg_root(deb_root, exe_path, data_dirs, staging)
 
         debian_dir = os.path.join(deb_root, "DEBIAN")
         os.makedirs(debian_dir, exist_ok=True)
@@ -311,34 +921,26 @@ def build_deb(exe_path, data_dirs, version):
             f.write(control_content)
 
         output_deb = os.path.abspath(f"cerberus_{version}_amd64.deb")
-        subprocess.check_call(["dpkg-deb", "--build", deb_root, output_deb])
+        _check_call(["dpkg-deb", "--build", deb_root, output_deb])
         print("    Built .deb:", output_deb)
 
 
 # -----------------------------
 # ARCH PKG PACKAGING
 # -----------------------------
-def build_arch_pkg(exe_path, data_dirs, version):
+def build_arch_pkg(exe_path, data_dirs, version, compress=(DEFAULT_ARCH_COMPRESSION, None, None),
+                   staging=None):
+    codec, level, threads = compress
+    ext = ARCH_PKG_EXTENSIONS[codec]
+
     if shutil.which("tar") is None:
-        print("[!] tar not found, skipping .pkg.tar.zst packaging.")
+        print(f"[!] tar not found, skipping .pkg.tar{ext} packaging.")
         return
 
-    print("[*] Building Arch .pkg.tar.zst package...")
-    with tempfile.TemporaryDirectory() as tmpdir:
+    print(f"[*] Building Arch .pkg.tar{ext} package...")
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(staging) if staging else None) as tmpdir:
         pkg_root = os.path.join(tmpdir, "pkgroot")
-        bin_dir = os.path.join(pkg_root, "usr", "bin")
-        share_dir = os.path.join(pkg_root, "usr", "share", "cerberus")
-        os.makedirs(bin_dir, exist_ok=True)
-        os.makedirs(share_dir, exist_ok=True)
-
-        shutil.copy2(exe_path, os.path.join(bin_dir, "cerberus"))
-
-        for d in data_dirs:
-            if any(d == root or d.startswith(root + "/") for root in CORE_DATA_ROOTS):
-                src = d
-                dst = os.path.join(share_dir, d)
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst, dirs_exist_ok=True)
+        _populate_pkg_root(pkg_root, exe_path, data_dirs, staging)
 
         pkginfo_path = os.path.join(pkg_root, ".PKGINFO")
         pkginfo_content = textwrap.dedent(f"""\
@@ -355,74 +957,443 @@ def build_arch_pkg(exe_path, data_dirs, version):
         with open(pkginfo_path, "w") as f:
             f.write(pkginfo_content)
 
-        output_pkg = os.path.abspath(f"cerberus-{version}-1-x86_64.pkg.tar.zst")
-        cwd = os.getcwd()
-        os.chdir(pkg_root)
+        output_pkg = os.path.abspath(f"cerberus-{version}-1-x86_64.pkg.tar{ext}")
+
         try:
-            subprocess.check_call(
-                ["tar", "--zstd", "-cf", output_pkg, "."]
-            )
+            check_compression(CODECS[codec])
+        except PayloadError as e:
+            if codec != "zstd":
+                raise
+            print(f"[!] {e}, falling back to tar --zstd.")
+            _check_call(["tar", "--zstd", "-cf", output_pkg, "."], cwd=pkg_root)
+            print("    Built Arch package:", output_pkg)
+            return
+
+        # Plain tar on stdout, compressed here in independent chunks on all cores
+        tar_cmd = ["tar", "--sort=name", "-cf", "-", "."]
+        process = subprocess.Popen(tar_cmd, cwd=pkg_root, stdout=subprocess.PIPE)
+        try:
+            chunks = iter(lambda: process.stdout.read(ARCH_COMPRESS_CHUNK), b"")
+            with open(output_pkg, "wb") as f_out:
+                for packed in parallel_compress(chunks, CODECS[codec], level, threads):
+                    f_out.write(packed)
         finally:
-            os.chdir(cwd)
+            process.stdout.close()
+            rc = _wait_child(process)
+        if rc != 0:
+            raise subprocess.CalledProcessError(rc, tar_cmd)
 
         print("    Built Arch package:", output_pkg)
 
-def run_nuitka_stream(cmd):
-    import threading
-    import queue
+# -----------------------------
+# PACKAGING STAGE
+# -----------------------------
+class PackagingError(Exception):
+    """Raised by run_packaging once every target has run, if any failed."""
 
-    q = queue.Queue()
+    def __init__(self, failures):
+        super().__init__(", ".join(name for name, _ in failures))
+        self.failures = failures
 
-    def reader(stream, tag):
-        for line in iter(stream.readline, ''):
-            q.put((tag, line.rstrip()))
-        stream.close()
 
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        universal_newlines=True,
-        bufsize=1
-    )
+def _timed_call(fn, *fn_args):
+    import time
 
-    threads = [
-        threading.Thread(target=reader, args=(process.stdout, "OUT")),
-        threading.Thread(target=reader, args=(process.stderr, "ERR")),
-    ]
+    start = time.perf_counter()
+    fn(*fn_args)
+    return time.perf_counter() - start
 
-    for t in threads:
-        t.daemon = True
-        t.start()
 
-    # Drain queue until process exits
-    while True:
-        try:
-            tag, line = q.get(timeout=0.1)
-            if tag == "OUT":
-                print("[Nuitka]", line)
-            else:
-                print("[Nuitka:ERR]", line)
-        except queue.Empty:
-            if process.poll() is not None:
-                break
-
-    # Final drain
-    while not q.empty():
-        tag, line = q.get()
-        if tag == "OUT":
-            print("[Nuitka]", line)
+def run_packaging(args, exe_path, data_dirs):
+    """
+    Build every packaging target from one shared staging tree.
+
+    The staging tree lives under build/ so it can be hardlinked from the
+    project; the .deb, Arch package and encrypted payload are then built
+    in parallel workers. Prints per-target timings at the end, then raises
+    PackagingError with (target, exception) for every target that failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    timings = {}
+
+    with tempfile.TemporaryDirectory(dir="build", prefix="staging-") as tmpdir:
+        staging = os.path.join(tmpdir, "root")
+        print("[*] Staging package tree...")
+        timings["staging"] = _timed_call(stage_package_tree, exe_path, data_dirs, staging)
+
+        targets = []
+        if args.encrypt_data:
+            targets.append(("payload", encrypt_data_payload, (args, data_dirs)))
+        targets.append(("deb", build_deb, (exe_path, data_dirs, args.version, staging)))
+        targets.append((
+            "arch",
+            build_arch_pkg,
+            (exe_path, data_dirs, args.version,
+             compression_settings(args, DEFAULT_ARCH_COMPRESSION), staging),
+        ))
+
+        failures = []
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            futures = [(name, pool.submit(_timed_call, fn, *fn_args)) for name, fn, fn_args in targets]
+            for name, future in futures:
+                try:
+                    timings[name] = future.result()
+                except Exception as e:
+                    failures.append((name, e))
+
+    print("\nPackaging timings:")
+    for name, seconds in timings.items():
+        print(f"   • {name:<10}{seconds:8.2f}s")
+
+    if failures:
+        raise PackagingError(failures)
+
+    return timings
+
+
+# -----------------------------
+# NUITKA OUTPUT + TIMELINE
+# -----------------------------
+# Progress lines that start a new build phase, checked in order
+NUITKA_PHASES = [
+    ("Starting Python compilation", "module compile"),
+    ("Generating source code for C backend", "C code generation"),
+    ("Running C compilation via Scons", "C compile"),
+    ("Backend linking program", "linking"),
+    ("Creating single file from dist folder", "onefile compression"),
+]
+
+
+class BuildTimeline:
+    """Turns Nuitka progress lines into phases with start times and durations."""
+
+    def __init__(self):
+        import time
+
+        self._clock = time.monotonic
+        self.started_at = time.time()
+        self._start = self._clock()
+        self.phases = [{"phase": "startup", "start": 0.0, "end": None}]
+        self.returncode = None
+
+    def _now(self):
+        return round(self._clock() - self._start, 3)
+
+    def feed(self, line):
+        for marker, phase in NUITKA_PHASES:
+            if marker in line:
+                if self.phases[-1]["phase"] != phase:
+                    now = self._now()
+                    self.phases[-1]["end"] = now
+                    self.phases.append({"phase": phase, "start": now, "end": None})
+                return
+
+    def finish(self, returncode):
+        self.phases[-1]["end"] = self._now()
+        self.returncode = returncode
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "python": sys.version,
+            "nuitka": _nuitka_version(),
+            "returncode": self.returncode,
+            "total": self.phases[-1]["end"],
+            "phases": [
+                dict(p, duration=round(p["end"] - p["start"], 3)) for p in self.phases
+            ],
+        }
+
+    def write(self, path):
+        import json
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def _split_lines(buffer, data):
+    """
+    Append data to buffer and return the complete lines in it, without
+    their newline; the unfinished tail stays in buffer. Only new data is
+    searched, so a very long line costs linear time.
+    """
+    scanned = len(buffer)
+    buffer += data
+    lines = []
+    start = 0
+    end = buffer.find(b"\n", scanned)
+    while end != -1:
+        lines.append(bytes(buffer[start:end]))
+        start = end + 1
+        end = buffer.find(b"\n", start)
+    del buffer[:start]
+    return lines
+
+
+def _pump_pipes(process, on_line):
+    """
+    Read the stdout and stderr pipes of process as data arrives, with one
+    selectors loop in this thread, calling on_line(tag, raw) per line.
+    Lines have no length limit.
+    """
+    import selectors
+
+    buffers = {"OUT": bytearray(), "ERR": bytearray()}
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, "OUT")
+        selector.register(process.stderr, selectors.EVENT_READ, "ERR")
+        while selector.get_map():
+            for key, _ in selector.select():
+                tag = key.data
+                data = os.read(key.fd, 1 << 16)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    if buffers[tag]:
+                        on_line(tag, bytes(buffers[tag]))
+                    continue
+                for raw in _split_lines(buffers[tag], data):
+                    on_line(tag, raw)
+
+
+def run_nuitka_stream(cmd, echo=True, timeline_path=None):
+    """
+    Run Nuitka, reading stdout and stderr as they arrive through a selectors
+    loop over its pipes (no reader threads, no polling), and record a phase
+    timeline. Windows cannot select on pipes, so there the output is read
+    once Nuitka exits.
+
+    With echo=False output is collected and returned instead of printed.
+    Returns (returncode, stdout_lines, stderr_lines).
+    """
+    timeline = BuildTimeline()
+    collected = {"OUT": [], "ERR": []}
+
+    def on_line(tag, raw):
+        line = raw.decode("utf-8", errors="replace").rstrip()
+        timeline.feed(line)
+        collected[tag].append(line)
+        if echo:
+            print("[Nuitka]" if tag == "OUT" else "[Nuitka:ERR]", line, flush=True)
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        if os.name == "nt":
+            out, err = process.communicate()
+            for tag, data in (("OUT", out), ("ERR", err)):
+                for raw in data.splitlines():
+                    on_line(tag, raw)
         else:
-            print("[Nuitka:ERR]", line)
+            _pump_pipes(process, on_line)
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+        rc = _wait_child(process)
+    timeline.finish(rc)
+
+    if timeline_path:
+        timeline.write(timeline_path)
+
+    print("\nNuitka phases:")
+    for p in timeline.to_dict()["phases"]:
+        print(f"   • {p['phase']:<22}{p['duration']:8.2f}s")
+
+    return rc, collected["OUT"], collected["ERR"]
+
+
+# -----------------------------
+# BUILD PROFILING
+# -----------------------------
+# ru_maxrss is KiB on Linux, bytes on macOS
+_RSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# Largest peak RSS of the children reaped by _wait_child since the profiler
+# last reset it. Packaging targets wait for theirs from worker threads.
+_child_peak = {"rss": None}
+
 
+def _wait_child(process):
+    """
+    Wait for a Popen child and return its exit code. Where os.wait4 exists,
+    the child's peak RSS is kept for the current profiler phase; rusage for
+    all children together (RUSAGE_CHILDREN) only ever grows, so it cannot
+    give a per-phase peak.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait()
+
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    rss = usage.ru_maxrss * _RSS_SCALE
+    # max() of two ints is not atomic across threads, but the worst case is
+    # losing a smaller peak to a larger one
+    _child_peak["rss"] = max(_child_peak["rss"] or 0, rss)
     return process.returncode
 
 
+def _check_call(cmd, **popen_kwargs):
+    """subprocess.check_call(), waiting through _wait_child."""
+    process = subprocess.Popen(cmd, **popen_kwargs)
+    rc = _wait_child(process)
+    if rc != 0:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+def _read_proc_field(path, field):
+    """Leading integer of a "field: value" line in a /proc file, or None without /proc."""
+    try:
+        with open(path, "r", encoding="ascii") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == field:
+                    return int(value.split()[0])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _own_peak_rss():
+    """This process's peak RSS since the last _reset_peak_rss(), or None."""
+    kib = _read_proc_field("/proc/self/status", "VmHWM")
+    return None if kib is None else kib * 1024
+
+
+def _bytes_written():
+    """
+    Bytes this process and its reaped children sent to storage, page cache
+    included, from /proc/self/io; None without /proc.
+    """
+    return _read_proc_field("/proc/self/io", "write_bytes")
+
+
+def _reset_peak_rss():
+    # Linux only: lets each phase report its own peak instead of the running maximum
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    _child_peak["rss"] = None
+
+
+class BuildProfiler:
+    """
+    Times each build phase and samples peak RSS and bytes written.
+
+    Peak RSS is the larger of this process's own peak in the phase (VmHWM,
+    reset between phases) and the peaks of the children reaped through
+    _wait_child in it (Nuitka, dpkg-deb, tar). Bytes written come from
+    /proc/self/io, which counts writes still in the page cache and those of
+    reaped children. Either column is left empty where it cannot be
+    measured, instead of showing a running total.
+    """
+
+    def __init__(self):
+        import time
+
+        self._clock = time.perf_counter
+        self.rows = []
+        self._substeps = set()
+        self._current = None
+
+    def phase(self, name):
+        """Start a phase, ending the previous one."""
+        self.end()
+        _reset_peak_rss()
+        self._current = (name, self._clock(), _bytes_written())
+
+    def end(self):
+        if self._current is None:
+            return
+        name, start, written_before = self._current
+        self._current = None
+        peaks = [p for p in (_own_peak_rss(), _child_peak["rss"]) if p is not None]
+        written = _bytes_written()
+        self.rows.append({
+            "phase": name,
+            "seconds": round(self._clock() - start, 3),
+            "peak_rss": max(peaks) if peaks else None,
+            "bytes_written": None if written is None or written_before is None else written - written_before,
+        })
+
+    def add(self, name, seconds):
+        """Record a sub-step timed elsewhere (e.g. a parallel packaging target)."""
+        self._substeps.add(name)
+        self.rows.append({"phase": name, "seconds": round(seconds, 3), "peak_rss": None, "bytes_written": None})
+
+    def print_table(self):
+        print("\n=== BUILD PROFILE ===")
+        print(f"   {'phase':<26}{'time (s)':>10}{'peak RSS':>12}{'written':>12}")
+        for row in self.rows:
+            # Sub-steps recorded with add() are indented under their phase
+            label = "  " + row["phase"] if row["phase"] in self._substeps else row["phase"]
+            print(
+                f"   {label:<26}{row['seconds']:>10.2f}"
+                f"{_format_bytes(row['peak_rss']):>12}{_format_bytes(row['bytes_written']):>12}"
+            )
+        print("=====================\n")
+
+    def write(self, json_path, csv_path):
+        import csv
+        import json
+        import time
+
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "python": sys.version, "phases": self.rows}, f, indent=2)
+
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["phase", "seconds", "peak_rss", "bytes_written"])
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+def _format_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def compare_profiles(rows, previous_path):
+    """Print per-phase time deltas against a previous profile JSON."""
+    import json
+
+    try:
+        with open(previous_path, "r", encoding="utf-8") as f:
+            previous = {row["phase"]: row for row in json.load(f)["phases"]}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[!] Cannot read previous profile {previous_path}: {e}")
+        return
+
+    print(f"=== PROFILE COMPARISON (vs {previous_path}) ===")
+    print(f"   {'phase':<26}{'before':>10}{'after':>10}{'delta':>10}{'change':>9}")
+    for row in rows:
+        old = previous.get(row["phase"])
+        if old is None:
+            print(f"   {row['phase']:<26}{'-':>10}{row['seconds']:>10.2f}{'':>10}{'new':>9}")
+            continue
+
+        delta = row["seconds"] - old["seconds"]
+        change = delta / old["seconds"] if old["seconds"] else 0.0
+        flag = "  <-- regression" if change > PROFILE_REGRESSION_THRESHOLD and delta > 0.05 else ""
+        print(
+            f"   {row['phase']:<26}{old['seconds']:>10.2f}{row['seconds']:>10.2f}"
+            f"{delta:>+10.2f}{change:>+9.0%}{flag}"
+        )
+
+    for phase in previous.keys() - {row["phase"] for row in rows}:
+        print(f"   {phase:<26}{previous[phase]['seconds']:>10.2f}{'-':>10}{'':>10}{'gone':>9}")
+    print()
+
+
 # -----------------------------
 # MAIN BUILD EXECUTION
 # -----------------------------
 def main():
     args = parse_args()
+    profiler = BuildProfiler()
 
     print("Building with Nuitka...")
     os.makedirs("build", exist_ok=True)
@@ -430,6 +1401,9 @@ def main():
     # -----------------------------
     # EXTENDED DEBUG SECTION
     # -----------------------------
+    profiler.phase("toolchain probe")
+    toolchain = discover_toolchain(TOOLCHAIN_CACHE_PATH, refresh=args.refresh_toolchain)
+
     if DEBUG:
         print("\n=== EXTENDED DEBUG MODE ENABLED ===")
         print("Python Executable:", sys.executable)
@@ -440,22 +1414,12 @@ def main():
         for p in os.environ.get("PATH", "").split(":"):
             print("   •", p)
         print("\nInstalled Nuitka Version:")
-        try:
-            subprocess.run([sys.executable, "-m", "nuitka", "--version"], check=False)
-        except Exception as e:
-            print("   [!] Failed to query Nuitka version:", e)
-
-        print("\nChecking for UPX:")
-        print("   upx found:", shutil.which("upx"))
+        print("  ", toolchain["nuitka"] or "[!] not installed")
 
-        print("\nChecking for Clang:")
-        print("   clang found:", shutil.which("clang"))
-
-        print("\nChecking for GCC:")
-        print("   gcc found:", shutil.which("gcc"))
-
-        print("\nChecking for patchelf:")
-        print("   patchelf found:", shutil.which("patchelf"))
+        print("\nToolchain:")
+        for tool, found in toolchain["tools"].items():
+            print(f"   {tool} found:", found)
+        print("   zstandard (onefile compression):", toolchain["zstandard"])
 
         print("\nEnvironment Variables:")
         for k, v in os.environ.items():
@@ -467,8 +1431,12 @@ def main():
     # -----------------------------
     # AUTO-DETECTION
     # -----------------------------
+    profiler.phase("auto-detection")
     print("Auto-detecting packages and data directories...")
-    packages, data_dirs = detect_packages_and_data()
+    packages, data_dirs = detect_packages_and_data(
+        workers=args.scan_workers,
+        cache_path=None if args.no_scan_cache else SCAN_CACHE_PATH,
+    )
 
     print("\nPython Packages Found:")
     for p in packages:
@@ -481,15 +1449,28 @@ def main():
     # -----------------------------
     # COMMAND GENERATION
     # -----------------------------
+    profiler.phase("command generation")
     print("\nGenerating Nuitka command...\n")
 
     os.environ.setdefault("CFLAGS", "-Wno-macro-redefined") # Suppress _XOPEN_SOURCE warnings
 
-    cmd = build_command(packages, data_dirs, args)
+    if args.upx and not (toolchain["zstandard"] or toolchain["tools"].get("upx")):
+        print("[!] --upx given but neither zstandard nor upx is available, building uncompressed.")
+
+    if args.incremental:
+        # Keep ccache and downloads with the project so they survive between runs
+        os.environ.setdefault("NUITKA_CACHE_DIR", os.path.abspath(NUITKA_CACHE_DIR))
+        if toolchain["tools"].get("ccache") is None:
+            print("[!] ccache not found, incremental builds will only reuse Nuitka's build dir.")
+
+    cmd = build_command(packages, data_dirs, args, toolchain)
 
     print("COMMAND:")
     print(" ".join(cmd))
 
+    fingerprint = compute_build_fingerprint(cmd, packages)
+    up_to_date = not args.force_rebuild and fingerprint_matches(fingerprint)
+
     # -----------------------------
     # PRE-FLIGHT CHECK
     # -----------------------------
@@ -500,83 +1481,69 @@ def main():
         print("Build folder exists:", os.path.isdir("build"))
         print("====================================\n")
 
+    problems = [] if up_to_date else toolchain_problems(toolchain)
+    if not os.path.exists(ENTRY):
+        problems.append(f"Entry point {ENTRY} not found")
+    if problems:
+        for problem in problems:
+            print("[!]", problem)
+        print("\nBuild aborted before running Nuitka.")
+        sys.exit(1)
+
     # -----------------------------
     # RUN BUILD WITH LIVE OUTPUT
     # -----------------------------
-    print("\nRunning Nuitka...\n")
-
     try:
-        if args.debug_stream:
-            rc = run_nuitka_stream(cmd)
+        profiler.phase("compilation")
+        if up_to_date:
+            print("\nBuild fingerprint unchanged, skipping Nuitka compilation.")
+        elif args.debug_stream:
+            print("\nRunning Nuitka...\n")
+            rc, _, _ = run_nuitka_stream(cmd, timeline_path=TIMELINE_PATH)
             if rc != 0:
                 print(f"[!] Nuitka failed with exit code {rc}")
                 sys.exit(rc)
         else:
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            print("\nRunning Nuitka...\n")
+            rc, stdout, stderr = run_nuitka_stream(cmd, echo=False, timeline_path=TIMELINE_PATH)
             print("\n=== STDOUT ===")
-            print(result.stdout)
+            print("\n".join(stdout))
             print("\n=== STDERR ===")
-            print(result.stderr)
-            result.check_returncode()
+            print("\n".join(stderr))
+            if rc != 0:
+                raise subprocess.CalledProcessError(rc, cmd)
+
+        if not up_to_date:
+            write_fingerprint(fingerprint)
 
         print("\nBuild complete!")
 
-        exe_path = os.path.join("build", OUTPUT_NAME)
-        if not os.path.exists(exe_path):
-            candidate = Path("build") / (OUTPUT_NAME + ".bin")
-            if candidate.exists():
-                exe_path = str(candidate)
+        exe_path = find_executable()
 
         print("Executable generated:", exe_path)
 
-        if args.encrypt_data:
-            encrypt_data_payload(args, data_dirs)
+        profiler.phase("packaging")
+        timings = run_packaging(args, exe_path, data_dirs)
+        profiler.end()
+        for name, seconds in timings.items():
+            profiler.add(f"package: {name}", seconds)
 
-        build_deb(exe_path, data_dirs, args.version)
-        build_arch_pkg(exe_path, data_dirs, args.version)
+        profiler.print_table()
+        if args.compare:
+            compare_profiles(profiler.rows, args.compare)
+        profiler.write(PROFILE_PATH, PROFILE_CSV_PATH)
+        print("Build profile written to:", PROFILE_PATH, "and", PROFILE_CSV_PATH)
 
     except subprocess.CalledProcessError:
         print("\nBuild failed — see logs above.")
         sys.exit(1)
-
-        # Stream output live
-        if process.stdout is not None:
-            for line in process.stdout:
-                print("[Nuitka]", line.rstrip())
-
-        stderr_output = []
-        if process.stderr is not None:
-            for line in process.stderr:
-                stderr_output.append(line)
-                print("[Nuitka:ERR]", line.rstrip())
-
-        process.wait()
-
-        if process.returncode != 0:
-            print("\n[!] Nuitka failed with exit code:", process.returncode)
-            print("\n=== STDERR (captured) ===")
-            print("".join(stderr_output))
-            raise subprocess.CalledProcessError(process.returncode, cmd)
-
-        print("\nBuild complete!")
-
-        exe_path = os.path.join("build", OUTPUT_NAME)
-        if not os.path.exists(exe_path):
-            candidate = Path("build") / (OUTPUT_NAME + ".bin")
-            if candidate.exists():
-                exe_path = str(candidate)
-
-        print("Executable generated:", exe_path)
-
-        # Optional encrypted payload
-        if args.encrypt_data:
-            encrypt_data_payload(args, data_dirs)
-
-        # Packaging
-        build_deb(exe_path, data_dirs, args.version)
-        build_arch_pkg(exe_path, data_dirs, args.version)
-
-    except subprocess.CalledProcessError:
+    except PackagingError as e:
+        for name, error in e.failures:
+            print(f"[!] Packaging target '{name}' failed: {error}")
+        print("\nBuild failed — see logs above.")
+        sys.exit(1)
+    except (PayloadError, OSError) as e:
+        print(f"[!] {e}")
         print("\nBuild failed — see logs above.")
         sys.exit(1)
 
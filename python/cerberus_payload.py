@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+#
+# Author: Crazygiscool
+# Description: Encrypted data payload format shared by build.py and the runtime.
+#
+# Two formats are supported. Integers are little-endian in both.
+#
+# Stream (a tar cut into chunks, read front to back):
+#
+#   header   MAGIC (8) | version u8 | compression u8 | chunk_size u32 | nonce_prefix (8)
+#   chunks   repeated: length u32 | AES-GCM ciphertext of (flag u8 | chunk data)
+#   index    length u32 | AES-GCM ciphertext of the chunk offsets (u64 each)
+#   trailer  index_offset u64 | MAGIC (8)
+#
+# Archive (random access, one member can be read without touching the rest):
+#
+#   header   ARCHIVE_MAGIC (8) | version u8 | compression u8 | block_size u32 | nonce_prefix (8)
+#   blocks   AES-GCM ciphertexts of file blocks
+#   toc      AES-GCM ciphertext of the gzipped JSON table of contents
+#   trailer  toc_offset u64 | toc_length u64 | ARCHIVE_MAGIC (8)
+#
+# Chunks and blocks are compressed independently (gzip, zstd or xz), so
+# they can be compressed on many cores and decompressed one at a time. A
+# chunk/block that does not shrink is stored raw.
+#
+# Every chunk/block is authenticated together with the header and its
+# position, so they cannot be swapped, reordered or truncated without
+# decryption failing. The key is the same urlsafe-base64 32-byte key that
+# Fernet.generate_key() produces.
+
+import os
+import io
+import base64
+import struct
+import json
+import mmap
+import gzip
+import lzma
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM # type: ignore
+from cryptography.exceptions import InvalidTag # type: ignore
+
+MAGIC = b"CERBDAT1"
+ARCHIVE_MAGIC = b"CERBARC1"
+STREAM_VERSION = 2
+ARCHIVE_VERSION = 1
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Per-chunk / per-block compression codecs, stored in the header
+COMPRESSION_NONE = 0
+COMPRESSION_GZIP = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_XZ = 3
+
+CODECS = {
+    "none": COMPRESSION_NONE,
+    "gzip": COMPRESSION_GZIP,
+    "zstd": COMPRESSION_ZSTD,
+    "xz": COMPRESSION_XZ,
+}
+
+DEFAULT_LEVELS = {
+    COMPRESSION_NONE: 0,
+    COMPRESSION_GZIP: 6,
+    COMPRESSION_ZSTD: 3,
+    COMPRESSION_XZ: 6,
+}
+
+_FLAG_RAW = 0
+_FLAG_COMPRESSED = 1
+
+_HEADER = struct.Struct("<8sBBI8s")
+_LENGTH = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+_CHUNK_AAD = struct.Struct("<QB")
+_TRAILER = struct.Struct("<Q8s")
+_BLOCK_AAD = struct.Struct("<I")
+_ARCHIVE_TRAILER = struct.Struct("<QQ8s")
+
+_INDEX_COUNTER = 0xFFFFFFFF
+
+
+class PayloadError(Exception):
+    """Raised when a payload is malformed, truncated or fails authentication."""
+
+
+def _aead(key):
+    raw = base64.urlsafe_b64decode(key)
+    if len(raw) != 32:
+        raise PayloadError("Payload key must be 32 bytes (urlsafe base64)")
+    return AESGCM(raw)
+
+
+def _nonce(prefix, counter):
+    return prefix + struct.pack("<I", counter)
+
+
+# -----------------------------
+# COMPRESSION
+# -----------------------------
+def _zstd():
+    try:
+        import zstandard # type: ignore
+    except ImportError:
+        raise PayloadError("zstd compression needs the 'zstandard' package") from None
+    return zstandard
+
+
+def check_compression(compression):
+    """Raise PayloadError if the codec is unknown or its module is missing."""
+    if compression not in DEFAULT_LEVELS:
+        raise PayloadError(f"Unknown compression {compression}")
+    if compression == COMPRESSION_ZSTD:
+        _zstd()
+
+
+def compress_block(data, compression, level=None):
+    """
+    Compress one independent block. Output only depends on the input,
+    codec and level, so it is identical however many threads are used.
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+
+    if compression == COMPRESSION_NONE:
+        return bytes(data)
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if compression == COMPRESSION_ZSTD:
+        return _zstd().ZstdCompressor(level=level).compress(data)
+    if compression == COMPRESSION_XZ:
+        return lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+    raise PayloadError(f"Unknown compression {compression}")
+
+
+def decompress_block(data, compression):
+    if compression == COMPRESSION_NONE:
+        return data
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression == COMPRESSION_ZSTD:
+        return _zstd().ZstdDecompressor().decompress(data)
+    if compression == COMPRESSION_XZ:
+        return lzma.decompress(data, format=lzma.FORMAT_XZ)
+    raise PayloadError(f"Unknown compression {compression}")
+
+
+def _compress_or_raw(data, compression, level):
+    """Returns (compressed, payload); payload is the raw data if compressing did not help."""
+    if compression != COMPRESSION_NONE:
+        packed = compress_block(data, compression, level)
+        if len(packed) < len(data):
+            return True, packed
+    return False, bytes(data)
+
+
+class _OrderedPool:
+    """
+    Run jobs on a thread pool and hand results back in submission order.
+
+    At most 2 * threads jobs are in flight, which bounds memory. With
+    threads=1 jobs run inline. zlib, lzma and zstandard release the GIL
+    while compressing, so threads scale across cores.
+    """
+
+    def __init__(self, threads=None):
+        self.threads = threads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+        self._pending = deque()
+
+    def submit(self, tag, fn, *args):
+        """Queue a job; returns the (tag, result) pairs that had to be collected to make room."""
+        if self._pool is None:
+            return [(tag, fn(*args))]
+
+        self._pending.append((tag, self._pool.submit(fn, *args)))
+        ready = []
+        while len(self._pending) > 2 * self.threads:
+            done_tag, future = self._pending.popleft()
+            ready.append((done_tag, future.result()))
+        return ready
+
+    def drain(self):
+        while self._pending:
+            tag, future = self._pending.popleft()
+            yield tag, future.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            for _, future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._pool.shutdown()
+
+
+def parallel_compress(blocks, compression, level=None, threads=None):
+    """
+    Compress an iterable of blocks on a thread pool, yielding the
+    compressed blocks in input order.
+
+    Each block becomes an independent gzip member / zstd frame / xz
+    stream, so concatenating the output gives a valid file for that codec.
+    """
+    check_compression(compression)
+    pool = _OrderedPool(threads)
+    try:
+        for block in blocks:
+            for _, packed in pool.submit(None, compress_block, block, compression, level):
+                yield packed
+        for _, packed in pool.drain():
+            yield packed
+    finally:
+        pool.shutdown()
+
+
+# -----------------------------
+# WRITER
+# -----------------------------
+class StreamWriter(io.RawIOBase):
+    """
+    Write-only file object that cuts everything written to it into
+    chunk_size pieces, compresses them on a thread pool and encrypts each
+    one straight to f_out in order.
+
+    At most 2 * threads chunks are held in memory. close() writes the last
+    chunk, the index and the trailer; it does not close f_out.
+    """
+
+    def __init__(self, f_out, key, chunk_size=DEFAULT_CHUNK_SIZE, compression=COMPRESSION_NONE,
+                 level=None, threads=None):
+        super().__init__()
+        check_compression(compression)
+        self._out = f_out
+        self._aead = _aead(key)
+        self._chunk_size = chunk_size
+        self._compression = compression
+        self._level = level
+        self._pool = _OrderedPool(threads)
+        self._buf = bytearray()
+        self._offsets = []
+        self._prefix = os.urandom(8)
+        self._header = _HEADER.pack(MAGIC, STREAM_VERSION, compression, chunk_size, self._prefix)
+        self._pos = 0
+        self._emit(self._header)
+
+    def writable(self):
+        return True
+
+    def _emit(self, data):
+        self._out.write(data)
+        self._pos += len(data)
+
+    def _submit_chunk(self, data, last):
+        ready = self._pool.submit(last, _compress_or_raw, data, self._compression, self._level)
+        for done_last, packed in ready:
+            self._write_chunk(packed, done_last)
+
+    def _write_chunk(self, packed, last):
+        compressed, data = packed
+        index = len(self._offsets)
+        if index >= _INDEX_COUNTER:
+            raise PayloadError("Too many chunks for a single payload")
+
+        flag = bytes([_FLAG_COMPRESSED if compressed else _FLAG_RAW])
+        aad = self._header + _CHUNK_AAD.pack(index, last)
+        ct = self._aead.encrypt(_nonce(self._prefix, index), flag + data, aad)
+        self._offsets.append(self._pos)
+        self._emit(_LENGTH.pack(len(ct)))
+        self._emit(ct)
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed payload")
+
+        self._buf += data
+        size = self._chunk_size
+        if len(self._buf) > size:
+            # Keep the tail buffered: the final chunk must be written by close()
+            cut = (len(self._buf) - 1) // size * size
+            for start in range(0, cut, size):
+                self._submit_chunk(bytes(self._buf[start:start + size]), last=False)
+            del self._buf[:cut]
+        return len(data)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Never finalize a payload whose contents were cut short
+            self._buf = bytearray()
+            self._pool.shutdown()
+            super().close()
+            return
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self._submit_chunk(bytes(self._buf), last=True)
+            for done_last, packed in self._pool.drain():
+                self._write_chunk(packed, done_last)
+        finally:
+            self._pool.shutdown()
+        self._buf = bytearray()
+
+        index = b"".join(_OFFSET.pack(o) for o in self._offsets)
+        index_offset = self._pos
+        ct = self._aead.encrypt(_nonce(self._prefix, _INDEX_COUNTER), index, self._header)
+        self._emit(_LENGTH.pack(len(ct)))
+        self._emit(ct)
+        self._emit(_TRAILER.pack(index_offset, MAGIC))
+        super().close()
+
+
+# -----------------------------
+# READER
+# -----------------------------
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise PayloadError("Payload is truncated")
+    return data
+
+
+def read_header(f):
+    """Read and validate the header. Returns (compression, chunk_size, header_bytes)."""
+    header = _read_exact(f, _HEADER.size)
+    magic, version, compression, chunk_size, _ = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise PayloadError("Not a Cerberus data payload")
+    if version != STREAM_VERSION:
+        raise PayloadError(f"Unsupported payload version {version}")
+    check_compression(compression)
+    return compression, chunk_size, header
+
+
+def iter_chunks(f, key, header=None):
+    """
+    Yield the decrypted, decompressed chunks of a payload in order,
+    reading f front to back. Only one chunk is held in memory at a time.
+
+    Pass header (from read_header) if it has already been consumed from f.
+    """
+    aead = _aead(key)
+    if header is None:
+        _, _, header = read_header(f)
+    compression, chunk_size = _HEADER.unpack(header)[2:4]
+    prefix = header[-8:]
+    max_ct = chunk_size + 1 + 16
+
+    index = 0
+    while True:
+        (length,) = _LENGTH.unpack(_read_exact(f, _LENGTH.size))
+        if length > max_ct:
+            raise PayloadError("Chunk length exceeds the declared chunk size")
+        ct = _read_exact(f, length)
+
+        # The last flag is not stored; try "more follows" first, it is the common case
+        for last in (False, True):
+            try:
+                data = aead.decrypt(_nonce(prefix, index), ct, header + _CHUNK_AAD.pack(index, last))
+                break
+            except InvalidTag:
+                continue
+        else:
+            raise PayloadError(f"Chunk {index} failed authentication")
+
+        if data[0] == _FLAG_COMPRESSED:
+            yield decompress_block(data[1:], compression)
+        else:
+            yield data[1:]
+        index += 1
+        if last:
+            return
+
+
+class StreamReader(io.RawIOBase):
+    """Read-only file object over the decrypted contents of a payload."""
+
+    def __init__(self, f_in, key, header=None):
+        super().__init__()
+        self._chunks = iter_chunks(f_in, key, header)
+        self._buf = b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf):
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+            self._pos = 0
+
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def open_payload(f_in, key):
+    """Return a buffered reader over the decrypted payload contents."""
+    _, _, header = read_header(f_in)
+    return io.BufferedReader(StreamReader(f_in, key, header))
+
+
+def extract_payload(path, key, dest):
+    """
+    Decrypt and unpack a payload into dest, streaming from disk.
+
+    Meant to be called by the runtime at startup.
+    """
+    with open(path, "rb") as f_in:
+        with tarfile.open(fileobj=open_payload(f_in, key), mode="r|") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(dest, filter="data")
+            else:
+                tar.extractall(dest)
+
+
+# -----------------------------
+# ARCHIVE WRITER
+# -----------------------------
+class ArchiveWriter:
+    """
+    Write a random-access archive to f_out.
+
+    Files are split into block_size blocks; blocks are compressed on a
+    thread pool, then encrypted and written in order, so memory is bounded
+    by 2 * threads blocks plus the table of contents.
+    """
+
+    def __init__(self, f_out, key, block_size=DEFAULT_BLOCK_SIZE, compression=COMPRESSION_GZIP,
+                 level=None, threads=None):
+        check_compression(compression)
+
+        self._out = f_out
+        self._aead = _aead(key)
+        self._block_size = block_size
+        self._compression = compression
+        self._level = level
+        self._pool = _OrderedPool(threads)
+        self._prefix = os.urandom(8)
+        self._header = _HEADER.pack(
+            ARCHIVE_MAGIC, ARCHIVE_VERSION, compression, block_size, self._prefix
+        )
+        self._next_block = 0
+        self._dirs = []
+        self._files = {}
+        self._pos = 0
+        self._closed = False
+        self._emit(self._header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._closed = True
+            self._pool.shutdown()
+
+    def _emit(self, data):
+        self._out.write(data)
+        self._pos += len(data)
+
+    def _write_block(self, member, packed):
+        compressed, stored = packed
+        block_id = self._next_block
+        if block_id >= _INDEX_COUNTER:
+            raise PayloadError("Too many blocks for a single archive")
+        self._next_block += 1
+
+        ct = self._aead.encrypt(
+            _nonce(self._prefix, block_id), stored, self._header + _BLOCK_AAD.pack(block_id)
+        )
+        offset = self._pos
+        self._emit(ct)
+
+        # A member's blocks are submitted back to back, so their ids are consecutive
+        if not member["blocks"]:
+            member["first"] = block_id
+        member["blocks"].append([offset, len(ct), compressed])
+
+    def add_file(self, path, arcname):
+        st = os.stat(path)
+        member = {
+            "size": st.st_size,
+            "mode": st.st_mode & 0o7777,
+            "mtime": int(st.st_mtime),
+            "first": 0,
+            "blocks": [],
+        }
+        self._files[arcname] = member
+
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(self._block_size)
+                if not data:
+                    break
+                ready = self._pool.submit(member, _compress_or_raw, data, self._compression, self._level)
+                for done_member, packed in ready:
+                    self._write_block(done_member, packed)
+
+    def add_dir(self, path, arcname):
+        """Add a directory tree, walking it in sorted order."""
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            rel = os.path.relpath(dirpath, path)
+            base = arcname if rel == "." else f"{arcname}/{rel.replace(os.sep, '/')}"
+            self._dirs.append(base)
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                if os.path.isfile(full):
+                    self.add_file(full, f"{base}/{name}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        try:
+            for member, packed in self._pool.drain():
+                self._write_block(member, packed)
+        finally:
+            self._pool.shutdown()
+
+        toc = gzip.compress(
+            json.dumps({"dirs": self._dirs, "files": self._files}, separators=(",", ":")).encode(),
+            mtime=0,
+        )
+        ct = self._aead.encrypt(_nonce(self._prefix, _INDEX_COUNTER), toc, self._header)
+        toc_offset = self._pos
+        self._emit(ct)
+        self._emit(_ARCHIVE_TRAILER.pack(toc_offset, len(ct), ARCHIVE_MAGIC))
+
+
+# -----------------------------
+# ARCHIVE READER
+# -----------------------------
+class Archive:
+    """
+    Random-access reader over an archive written by ArchiveWriter.
+
+    The file is mapped with mmap; opening the archive decrypts only the
+    table of contents, and reading a member decrypts only its blocks.
+    """
+
+    def __init__(self, path, key):
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._f.close()
+            raise PayloadError("Payload is truncated")
+
+        try:
+            self._load(key)
+        except Exception:
+            self.close()
+            raise
+
+    def _load(self, key):
+        mm = self._mm
+        if len(mm) < _HEADER.size + _ARCHIVE_TRAILER.size:
+            raise PayloadError("Payload is truncated")
+
+        self._header = bytes(mm[:_HEADER.size])
+        magic, version, compression, block_size, prefix = _HEADER.unpack(self._header)
+        if magic != ARCHIVE_MAGIC:
+            raise PayloadError("Not a Cerberus data archive")
+        if version != ARCHIVE_VERSION:
+            raise PayloadError(f"Unsupported payload version {version}")
+        check_compression(compression)
+
+        toc_offset, toc_length, trailer_magic = _ARCHIVE_TRAILER.unpack(
+            mm[len(mm) - _ARCHIVE_TRAILER.size:]
+        )
+        if trailer_magic != ARCHIVE_MAGIC or toc_offset + toc_length > len(mm) - _ARCHIVE_TRAILER.size:
+            raise PayloadError("Payload is truncated")
+
+        self._aead = _aead(key)
+        self._prefix = prefix
+        self._compression = compression
+        self.block_size = block_size
+
+        try:
+            toc = self._aead.decrypt(
+                _nonce(prefix, _INDEX_COUNTER), mm[toc_offset:toc_offset + toc_length], self._header
+            )
+        except InvalidTag:
+            raise PayloadError("Table of contents failed authentication")
+
+        toc = json.loads(gzip.decompress(toc))
+        self.dirs = toc["dirs"]
+        self._files = toc["files"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def names(self):
+        return sorted(self._files)
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def size(self, name):
+        return self._member(name)["size"]
+
+    def _member(self, name):
+        try:
+            return self._files[name]
+        except KeyError:
+            raise KeyError(f"No such member in archive: {name}") from None
+
+    def _read_block(self, member, index):
+        offset, length, compressed = member["blocks"][index]
+        block_id = member["first"] + index
+        try:
+            data = self._aead.decrypt(
+                _nonce(self._prefix, block_id),
+                self._mm[offset:offset + length],
+                self._header + _BLOCK_AAD.pack(block_id),
+            )
+        except InvalidTag:
+            raise PayloadError(f"Block {block_id} failed authentication")
+        return decompress_block(data, self._compression) if compressed else data
+
+    def open(self, name):
+        """Return a seekable, buffered binary reader over one member."""
+        return io.BufferedReader(_MemberReader(self, self._member(name)))
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def extract(self, name, dest):
+        member = self._member(name)
+        target = _safe_join(dest, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f_out:
+            for i in range(len(member["blocks"])):
+                f_out.write(self._read_block(member, i))
+        os.chmod(target, member["mode"])
+        os.utime(target, (member["mtime"], member["mtime"]))
+        return target
+
+    def extractall(self, dest):
+        for d in self.dirs:
+            os.makedirs(_safe_join(dest, d), exist_ok=True)
+        for name in self.names():
+            self.extract(name, dest)
+
+
+class _MemberReader(io.RawIOBase):
+    def __init__(self, archive, member):
+        super().__init__()
+        self._archive = archive
+        self._member = member
+        self._pos = 0
+        self._block_index = -1
+        self._block = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._member["size"] + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        size = self._member["size"]
+        if self._pos >= size:
+            return 0
+
+        block_size = self._archive.block_size
+        index, start = divmod(self._pos, block_size)
+        if index != self._block_index:
+            self._block = self._archive._read_block(self._member, index)
+            self._block_index = index
+
+        n = min(len(b), len(self._block) - start)
+        b[:n] = self._block[start:start + n]
+        self._pos += n
+        return n
+
+
+def _safe_join(dest, name):
+    target = os.path.normpath(os.path.join(dest, name))
+    if os.path.commonpath([os.path.abspath(dest), os.path.abspath(target)]) != os.path.abspath(dest):
+        raise PayloadError(f"Member escapes destination: {name}")
+    return target
+
+
+def open_archive(path, key):
+    """Open an archive for random access. Meant to be called by the runtime."""
+    return Archive(path, key)
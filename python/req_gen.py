@@ -1,98 +1,757 @@
 import ast
 import os
+import re
+import posixpath
 import sys
-import builtins
+import json
+import atexit
+import signal
+import select
+import struct
+import time
+import hashlib
+import argparse
 from pathlib import Path
 from tqdm import tqdm
+from pathspec import PathSpec # type: ignore
 from datetime import datetime
-from importlib.metadata import version, PackageNotFoundError
+from importlib.metadata import distributions
 
-# 📁 Setup log file
+# 📁 Setup log file (logs/ is created on the first message)
 log_dir = Path("logs")
-log_dir.mkdir(exist_ok=True)
 log_file = log_dir / f"requirements_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
 
+# Default import cache, relative to the scanned project
+IMPORT_CACHE_NAME = ".req_gen_cache.sqlite3"
+# Bump when the extractor's output changes so stale caches are dropped
+IMPORT_CACHE_VERSION = "2"
+
+# Standard library and compiled-in modules, never written to requirements
+STDLIB_MODULES = frozenset(sys.stdlib_module_names) | frozenset(sys.builtin_module_names)
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# Level of each "[TAG] ..." message; untagged or unknown tags are INFO
+TAG_LEVELS = {
+    "IMPORTS": "DEBUG",
+    "SKIP": "DEBUG",
+    "RESOLVE": "INFO",
+    "REMOVED": "WARNING",
+    "CACHE": "INFO",
+    "CHECK": "WARNING",
+    "WATCH": "INFO",
+    "GRAPH": "INFO",
+    "ERROR": "ERROR",
+}
+
+class BufferedLog:
+    """
+    Log file kept open for the whole run, with writes batched in a large
+    buffer instead of an open/append/close per message.
+
+    Flushed on close(), which is registered with atexit so it also runs
+    after an unhandled exception or sys.exit(). With path None every
+    message is dropped, for runs that must not write to disk.
+    """
+
+    def __init__(self, path, level="DEBUG", json_lines=False, buffer_size=1 << 16):
+        self.path = path
+        self.threshold = LOG_LEVELS[level]
+        self.json_lines = json_lines
+        self._buffer_size = buffer_size
+        self._f = None
+
+    def log(self, msg):
+        if self.path is None:
+            return
+        tag = msg[1:msg.index("]")] if msg.startswith("[") and "]" in msg else ""
+        level = TAG_LEVELS.get(tag, "INFO")
+        if LOG_LEVELS[level] < self.threshold:
+            return
+
+        if self._f is None:
+            self.path.parent.mkdir(exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8", buffering=self._buffer_size)
+
+        if self.json_lines:
+            text = msg[len(tag) + 2:].lstrip() if tag else msg
+            record = {"time": datetime.now().isoformat(), "level": level, "tag": tag, "msg": text}
+            self._f.write(json.dumps(record) + "\n")
+        else:
+            self._f.write(msg + "\n")
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+_logger = BufferedLog(log_file)
+atexit.register(lambda: _logger.close())
+
+def configure_logging(level="DEBUG", json_lines=False, to_file=True):
+    global _logger, log_file
+    _logger.close()
+    if json_lines:
+        log_file = log_file.with_suffix(".jsonl")
+    _logger = BufferedLog(log_file if to_file else None, level, json_lines)
+
 def log(msg):
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(msg + "\n")
-
-def load_gitignore(project_dir):
-    ignore_set = set()
-    gitignore_path = Path(project_dir) / ".gitignore"
-    if gitignore_path.exists():
-        for line in gitignore_path.read_text(encoding="utf-8").splitlines():
-            line = line.strip()
-            if line and not line.startswith("#"):
-                ignore_set.add(line.split("/")[0])
-    return ignore_set
-
-def should_skip(path, ignore_set):
-    parts = Path(path).parts
-    return any(part in ignore_set or part == ".git" for part in parts)
-
-def extract_imports_from_file(file_path):
+    _logger.log(msg)
+
+def flush_log():
+    _logger.flush()
+
+class GitIgnore:
+    """
+    Every .gitignore of a project, root and nested, matched the way git does.
+
+    Each file's patterns are relative to its own directory. The deepest
+    .gitignore with a matching pattern decides, and within a file the last
+    matching pattern wins, so "!keep.py" can re-include a file.
+    """
+
+    def __init__(self):
+        self._specs = {}
+
+    def add(self, rel_dir, gitignore_path):
+        with open(gitignore_path, "r", encoding="utf-8", errors="ignore") as f:
+            self._specs[rel_dir] = PathSpec.from_lines("gitwildmatch", f)
+
+    def ignored(self, rel_path, is_dir=False):
+        path = rel_path + "/" if is_dir else rel_path
+        parent = posixpath.dirname(rel_path)
+        while True:
+            spec = self._specs.get(parent)
+            if spec is not None:
+                include = spec.check_file(path[len(parent) + 1:] if parent else path).include
+                if include is not None:
+                    return include
+            if not parent:
+                return False
+            parent = posixpath.dirname(parent)
+
+def iter_python_files(project_dir, dirs=None):
+    """
+    Yield (path, key) for the .py files under project_dir that git would
+    not ignore; key is the path relative to project_dir with "/" separators,
+    which the cache, the import graph and the report all use.
+
+    Ignored directories (and .git) are pruned during the walk, so their
+    contents are never listed. Walked directories are appended to dirs.
+    """
+    gitignore = GitIgnore()
+    for dirpath, dirnames, filenames in os.walk(project_dir):
+        if dirs is not None:
+            dirs.append(dirpath)
+        rel_dir = dirpath[len(project_dir):].strip(os.sep).replace(os.sep, "/")
+        if ".gitignore" in filenames:
+            gitignore.add(rel_dir, os.path.join(dirpath, ".gitignore"))
+
+        prefix = rel_dir + "/" if rel_dir else ""
+        dirnames[:] = [d for d in dirnames if d != ".git" and not gitignore.ignored(prefix + d, is_dir=True)]
+        for name in filenames:
+            if name.endswith(".py") and not gitignore.ignored(prefix + name):
+                yield os.path.join(dirpath, name), prefix + name
+
+def parse_imports(source, filename="<unknown>"):
+    """
+    Every import statement in source as a set of (module, level, names) records.
+
+    "import a.b as c" gives ("a.b", 0, ()), "from ..x import y, z" gives
+    ("x", 2, ("y", "z")) and "from . import y" gives ("", 1, ("y",)).
+    """
+    node = ast.parse(source, filename=filename)
+    imports = set()
+    for item in ast.walk(node):
+        if isinstance(item, ast.Import):
+            for alias in item.names:
+                imports.add((alias.name, 0, ()))
+        elif isinstance(item, ast.ImportFrom):
+            names = tuple(alias.name for alias in item.names)
+            imports.add((item.module or "", item.level, names))
+    return imports
+
+_DOTTED = r"\w+(?:[ \t]*\.[ \t]*\w+)*"
+_ALIAS = r"\w+(?:[ \t]+as[ \t]+\w+)?"
+
+# Comments and string literals are matched only to be skipped, so every
+# hit on the last group is a real "import" keyword
+_LEX_RE = re.compile(
+    r'''
+      \#[^\n]*
+    | """[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""
+    | \'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'
+    | "[^"\\\n]*(?:\\.[^"\\\n]*)*"
+    | '[^'\\\n]*(?:\\.[^'\\\n]*)*'
+    | \b(import)\b
+    ''',
+    re.VERBOSE | re.DOTALL,
+)
+
+# "from <dots><module>" directly before an import keyword
+_FROM_PREFIX_RE = re.compile(rf"(?:^|[;:])[ \t]*from\b[ \t]*(\.*)[ \t]*({_DOTTED})?[ \t]*$")
+
+# "a.b as c, d" after an import keyword, up to the end of the statement
+_IMPORT_NAMES_RE = re.compile(
+    rf"[ \t]+({_DOTTED}(?:[ \t]+as[ \t]+\w+)?(?:[ \t]*,[ \t]*{_DOTTED}(?:[ \t]+as[ \t]+\w+)?)*)"
+    r"[ \t]*(?:[;#]|$)",
+    re.MULTILINE,
+)
+
+# "(a as b,  # comment\n c)", "a, \\\n b" or "*" after the import keyword of a from-import
+_FROM_NAMES_RE = re.compile(
+    r"[ \t]*(?:\(((?:[^)#]|\#[^\n]*(?=\n))*)\)"
+    rf"|(\*|{_ALIAS}(?:(?:[ \t]|\\\n)*,(?:[ \t]|\\\n)*{_ALIAS})*))[ \t]*(?:[;#]|$)",
+    re.MULTILINE,
+)
+_NAMES_NOISE_RE = re.compile(r"#[^\n]*|\\\n")
+
+_AS_RE = re.compile(r"\s+as\s+")
+
+def _dotted(text):
+    return "".join(text.split())
+
+def scan_imports(source):
+    """
+    Same records as parse_imports() for valid code, from a single regex pass
+    over the source instead of building and walking an AST.
+
+    Returns None when an import statement is laid out in a way the scanner
+    does not handle (a backslash continuation before the import keyword,
+    odd prefixes); callers then fall back to parse_imports().
+    """
+    if "import" not in source:
+        return set()
+    if "\r" in source:
+        source = source.replace("\r\n", "\n").replace("\r", "\n")
+
+    imports = set()
+    for match in _LEX_RE.finditer(source):
+        if match.group(1) is None:
+            continue
+
+        pos = match.start(1)
+        line_start = source.rfind("\n", 0, pos) + 1
+        if source.endswith("\\\n", 0, line_start):
+            return None
+
+        prefix = source[line_start:pos]
+        from_match = _FROM_PREFIX_RE.search(prefix)
+        if from_match:
+            names = _FROM_NAMES_RE.match(source, match.end(1))
+            if names is None:
+                return None
+            aliases = _NAMES_NOISE_RE.sub(" ", names.group(1) or names.group(2)).split(",")
+            imported = tuple(alias.split()[0] for alias in aliases if alias.strip())
+            module = _dotted(from_match.group(2) or "")
+            imports.add((module, len(from_match.group(1)), imported))
+            continue
+
+        # Plain "import" must start a statement: "x = 1; import y", "try: import y"
+        prefix = prefix.strip()
+        if prefix and not prefix.endswith((";", ":")):
+            return None
+
+        names = _IMPORT_NAMES_RE.match(source, match.end(1))
+        if names is None:
+            return None
+        for alias in names.group(1).split(","):
+            imports.add((_dotted(_AS_RE.split(alias.strip())[0]), 0, ()))
+
+    return imports
+
+def parse_imports_fast(source, filename="<unknown>"):
+    imports = scan_imports(source)
+    if imports is None:
+        return parse_imports(source, filename)
+    return imports
+
+# Selectable with --extractor; both must return the same records for valid code
+EXTRACTORS = {
+    "ast": parse_imports,
+    "scan": parse_imports_fast,
+}
+
+def format_import(record):
+    module, level, _ = record
+    return "." * level + module
+
+def _extract_imports(file_path, extractor="ast"):
+    """Returns (imports, error, sha256 of the file or None)."""
+    # No logging here: this also runs inside worker processes
+    digest = None
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            node = ast.parse(f.read(), filename=file_path)
-        imports = set()
-        for item in ast.walk(node):
-            if isinstance(item, ast.Import):
-                for alias in item.names:
-                    imports.add(alias.name.split('.')[0])
-            elif isinstance(item, ast.ImportFrom):
-                if item.module:
-                    imports.add(item.module.split('.')[0])
-        log(f"[IMPORTS] {file_path}: {sorted(imports)}")
-        return imports
+        with open(file_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        return EXTRACTORS[extractor](data.decode("utf-8"), file_path), None, digest
     except Exception as e:
-        log(f"[ERROR] Failed to parse {file_path}: {e}")
-        return set()
+        return set(), str(e), digest
+
+def _log_extraction(file_path, imports, error):
+    if error is None:
+        log(f"[IMPORTS] {file_path}: {sorted({format_import(record) for record in imports})}")
+    else:
+        log(f"[ERROR] Failed to parse {file_path}: {error}")
+
+def _extract_chunk(file_paths, extractor="ast"):
+    return [_extract_imports(path, extractor) for path in file_paths]
+
+def iter_extracted_imports(file_paths, workers=1, chunk_size=None, extractor="ast"):
+    """
+    Yield (file_path, imports, error, digest) for every file, in input order.
+
+    workers > 1 spreads parsing over a process pool; files are sent in
+    chunks so each round trip parses many files.
+    """
+    if workers <= 1 or len(file_paths) < 2:
+        for file_path in tqdm(file_paths, desc="Scanning Python files"):
+            yield (file_path, *_extract_imports(file_path, extractor))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Forked workers must not inherit (and later duplicate) unflushed log lines
+    flush_log()
+
+    if chunk_size is None:
+        chunk_size = max(1, min(256, len(file_paths) // (workers * 8)))
+    chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            tqdm(total=len(file_paths), desc="Scanning Python files") as bar:
+        results = pool.map(_extract_chunk, chunks, [extractor] * len(chunks))
+        for chunk, chunk_results in zip(chunks, results):
+            for file_path, result in zip(chunk, chunk_results):
+                yield (file_path, *result)
+            bar.update(len(chunk))
+
+class ImportCache:
+    """
+    SQLite store of each file's extracted imports, keyed by path and
+    validated by size + mtime, then by content hash.
+
+    A file whose size and mtime match is trusted without being read. If
+    they differ but the hash matches (touched, checkout), only the stat is
+    refreshed. Everything else is parsed again.
+
+    read_only=True (--check) opens an existing cache without changing it,
+    and save() writes nothing; a missing or stale cache is simply empty.
+    """
+
+    # A file written just before or during a scan can be written again
+    # within the same mtime tick (up to 2 s on FAT, 1 s on some network
+    # mounts), leaving size and mtime unchanged while the content differs.
+    # Rows for files modified less than RACY_NS before the scan started are
+    # stored with mtime 0, so the next run never matches on the stat alone.
+    # apply_license.VerifiedCache refers here.
+    RACY_NS = 2_000_000_000
+
+    def __init__(self, path, extractor="ast", read_only=False):
+        import sqlite3
+
+        self.read_only = read_only
+        self._rows = {}
+        self._updates = {}
+        self._started_ns = time.time_ns()
+        # Entries from another extractor may differ on files only one can read
+        cache_version = f"{IMPORT_CACHE_VERSION}-{extractor}"
+
+        if read_only:
+            try:
+                db = sqlite3.connect(Path(os.path.abspath(path)).as_uri() + "?mode=ro", uri=True)
+            except sqlite3.Error:
+                return
+            try:
+                row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if row is not None and row[0] == cache_version:
+                    self._load(db)
+            except sqlite3.Error:
+                pass
+            finally:
+                db.close()
+            return
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, imports TEXT, error TEXT)"
+        )
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != cache_version:
+            self._db.execute("DELETE FROM files")
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (cache_version,))
+        self._load(self._db)
+
+    def _load(self, db):
+        self._rows = {
+            path: (size, mtime_ns, sha, imports, error)
+            for path, size, mtime_ns, sha, imports, error in db.execute("SELECT * FROM files")
+        }
+
+    def _stat(self, st):
+        mtime = 0 if st.st_mtime_ns >= self._started_ns - self.RACY_NS else st.st_mtime_ns
+        return st.st_size, mtime
+
+    def lookup(self, key, file_path):
+        """Returns (imports, error) if the cached entry is still valid, else None."""
+        row = self._rows.get(key)
+        if row is None:
+            return None
+
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+
+        size, mtime_ns, sha, imports, error = row
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            try:
+                with open(file_path, "rb") as f:
+                    if hashlib.sha256(f.read()).hexdigest() != sha:
+                        return None
+            except OSError:
+                return None
+            self._updates[key] = (*self._stat(st), sha, imports, error)
+
+        return {(module, level, tuple(names)) for module, level, names in json.loads(imports)}, error
+
+    def store(self, key, file_path, imports, error, digest):
+        if digest is None:
+            return
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return
+        self._updates[key] = (
+            *self._stat(st), digest, json.dumps(sorted(imports)), error
+        )
+
+    def save(self, keys):
+        """Write new entries and prune files that no longer exist; returns the number pruned."""
+        if self.read_only:
+            return 0
+        live = set(keys)
+        gone = [(path,) for path in self._rows if path not in live]
+        with self._db:
+            self._db.executemany("DELETE FROM files WHERE path = ?", gone)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, *row) for path, row in self._updates.items()],
+            )
+        self._db.close()
+        return len(gone)
+
+class ImportGraph:
+    """
+    Resolves import records to files inside the project, so first-party
+    modules are never mistaken for requirements, and follows them from
+    entry points to find the files that are actually used.
+
+    Absolute imports are looked up the way a script run from the project
+    would see them: the importing file's own directory first, then the
+    project root (and src/ if present). Anything not found there is an
+    external top-level name.
+    """
+
+    def __init__(self, project_dir, files):
+        self.project_dir = project_dir
+        self.paths = {key: path for path, key in files}
+        self.dirs = set()
+        for key in self.paths:
+            parent = posixpath.dirname(key)
+            while parent and parent not in self.dirs:
+                self.dirs.add(parent)
+                parent = posixpath.dirname(parent)
+        self.roots = ["", "src"] if "src" in self.dirs else [""]
 
-def scan_project_for_imports(project_dir):
-    ignore_set = load_gitignore(project_dir)
-    all_py_files = []
+    def key(self, path):
+        """Key of a path given outside the walk, such as an --entry file."""
+        return os.path.relpath(path, self.project_dir).replace(os.sep, "/")
+
+    def _resolve(self, base, parts):
+        """Files executed by importing parts from base, or None if parts[0] is not there."""
+        found = []
+        path = base
+        for i, part in enumerate(parts):
+            path = f"{path}/{part}" if path else part
+            if path + "/__init__.py" in self.paths:
+                found.append(path + "/__init__.py")
+            elif path + ".py" in self.paths:
+                found.append(path + ".py")
+                break
+            elif path not in self.dirs:
+                if i == 0:
+                    return None
+                break
+        return found
+
+    def resolve(self, file_key, record):
+        """Returns (project files the import loads, external dotted module or None)."""
+        module, level, names = record
+        parts = module.split(".") if module else []
+
+        if level:
+            base = posixpath.dirname(file_key)
+            for _ in range(level - 1):
+                base = posixpath.dirname(base)
+            bases = [base]
+        else:
+            bases = dict.fromkeys([posixpath.dirname(file_key), *self.roots])
+
+        for base in bases:
+            found = self._resolve(base, parts)
+            if found is None:
+                continue
+            # "from pkg import mod" also loads pkg/mod.py when it is a submodule
+            depth = len(found)
+            for name in names:
+                submodule = self._resolve(base, parts + [name]) if name != "*" else None
+                if submodule and len(submodule) > depth:
+                    found.append(submodule[-1])
+            init = f"{base}/__init__.py" if base else "__init__.py"
+            if not parts and init in self.paths:
+                found.append(init)
+            return found, None
+
+        if level or not parts:
+            return [], None
+        return [], module
+
+    def external_imports(self, file_key, imports):
+        """
+        Dotted external modules imported by the file at file_key. "from ns
+        import pkg" also gives ns.pkg, since pkg may be a distribution's
+        portion of a namespace package.
+        """
+        external = set()
+        for record in imports:
+            module = self.resolve(file_key, record)[1]
+            if module:
+                external.add(module)
+                external.update(f"{module}.{name}" for name in record[2] if name != "*")
+        return external
+
+    def reachable(self, entries, extracted):
+        """Paths of every project file imported, directly or not, by the entry files."""
+        seen = set()
+        stack = [self.key(entry) for entry in entries]
+        while stack:
+            file_key = stack.pop()
+            if file_key in seen:
+                continue
+            seen.add(file_key)
+            imports, _ = extracted[self.paths[file_key]]
+            for record in imports:
+                stack.extend(self.resolve(file_key, record)[0])
+        return {self.paths[file_key] for file_key in seen}
+
+def scan_project_for_imports(
+    project_dir, workers=1, chunk_size=None, cache_path=None, extractor="ast", entries=None,
+    memo=None, stats=None, dirs=None, read_only_cache=False,
+):
+    """
+    Returns {external module: set of keys of the files importing it}.
+
+    Imports that resolve to files inside the project are left out. With
+    entries, only files reachable from those entry points are counted.
+
+    memo is an in-memory {path: (imports, error)} kept between calls by
+    watch mode: its entries are trusted without a stat, so the caller must
+    drop the paths it knows have changed. It is updated in place.
+    read_only_cache opens the cache at cache_path without writing to it.
+    """
+    files = list(iter_python_files(project_dir, dirs))
+    keys = dict(files)
     import_sources = {}
 
-    for root, _, files in os.walk(project_dir):
-        for file in files:
-            if file.endswith(".py"):
-                full_path = os.path.join(root, file)
-                if not should_skip(full_path, ignore_set):
-                    all_py_files.append(full_path)
+    cache = ImportCache(cache_path, extractor, read_only_cache) if cache_path else None
+
+    extracted = {}
+    to_parse = list(keys)
+    if memo is not None or cache is not None:
+        to_parse = []
+        for file_path, file_key in files:
+            hit = memo.get(file_path) if memo is not None else None
+            if hit is None and cache is not None:
+                hit = cache.lookup(file_key, file_path)
+            if hit is None:
+                to_parse.append(file_path)
+            else:
+                extracted[file_path] = hit
+
+    for file_path, imports, error, digest in iter_extracted_imports(
+        to_parse, workers, chunk_size, extractor
+    ):
+        extracted[file_path] = (imports, error)
+        if cache is not None:
+            cache.store(keys[file_path], file_path, imports, error, digest)
+
+    if cache is not None:
+        pruned = cache.save(keys.values())
+        log(
+            f"[CACHE] {len(files) - len(to_parse)} cached, "
+            f"{len(to_parse)} parsed, {pruned} pruned"
+        )
+
+    if memo is not None:
+        memo.clear()
+        memo.update(extracted)
 
-    for file_path in tqdm(all_py_files, desc="Scanning Python files"):
-        imports = extract_imports_from_file(file_path)
-        for package in imports:
-            import_sources.setdefault(package, set()).add(file_path)
+    graph = ImportGraph(project_dir, files)
+    used_files = files
+    if entries:
+        missing = [entry for entry in entries if graph.key(entry) not in graph.paths]
+        if missing:
+            raise ValueError(f"Entry point(s) not among the scanned files: {', '.join(missing)}")
+        reachable = graph.reachable(entries, extracted)
+        used_files = [(file_path, file_key) for file_path, file_key in files if file_path in reachable]
+        log(f"[GRAPH] {len(used_files)} of {len(files)} files reachable from {', '.join(entries)}")
+
+    # Merge in walk order so the log and results do not depend on the cache
+    for file_path, _ in files:
+        _log_extraction(file_path, *extracted[file_path])
+    for file_path, file_key in used_files:
+        imports, _ = extracted[file_path]
+        for package in graph.external_imports(file_key, imports):
+            import_sources.setdefault(package, set()).add(file_key)
+
+    if stats is not None:
+        stats.update(
+            files=len(files),
+            cached=len(files) - len(to_parse),
+            parsed=len(to_parse),
+            used=len(used_files),
+        )
 
     log(f"[SUMMARY] Total unique imports: {len(import_sources)}")
     return import_sources
 
-def resolve_versions(import_sources):
+def _namespace_portions(dist, top):
+    """
+    Dotted names of the packages dist ships under top when top is a
+    namespace package for it (no top/__init__.py), else None.
+    """
+    files = [f for f in dist.files or () if f.parts[0] == top and f.suffix == ".py"]
+    inits = {str(f) for f in files if f.name == "__init__.py"}
+    if f"{top}/__init__.py" in inits:
+        return None
+
+    portions = set()
+    for f in files:
+        parts = f.with_suffix("").parts
+        # The first level with an __init__.py, or the module itself
+        depth = next(
+            (d for d in range(2, len(parts)) if "/".join(parts[:d]) + "/__init__.py" in inits),
+            len(parts),
+        )
+        portions.add(".".join(parts[:depth]))
+    return portions
+
+def build_distribution_index():
+    """
+    Map each importable name to its installed [(distribution, version)].
+
+    Built from one pass over the installed metadata instead of a version()
+    call per import, and gives the real distribution name when it differs
+    from the import name (bs4 -> beautifulsoup4). Top-level names come from
+    top_level.txt or the .py files in RECORD, as in packages_distributions().
+
+    A top-level name shipped by several distributions is usually a
+    namespace package (google, azure). Those distributions are keyed on
+    the dotted packages their RECORD lists instead (google.protobuf), and
+    the shared name maps only to a distribution that really owns it.
+    """
+    index = {}
+    by_name = {}
+    for dist in distributions():
+        metadata = dist.metadata
+        dist_name = metadata["Name"]
+        # Same shadowing as version(): the first copy on sys.path wins
+        if dist_name in by_name:
+            continue
+        by_name[dist_name] = dist
+
+        top_level = (dist.read_text("top_level.txt") or "").split()
+        if not top_level:
+            top_level = {
+                f.parts[0] if len(f.parts) > 1 else f.with_suffix("").name
+                for f in dist.files or ()
+                if f.suffix == ".py"
+            }
+        for name in top_level:
+            index.setdefault(name, []).append((dist_name, metadata["Version"]))
+
+    for top, owners in list(index.items()):
+        if len(owners) < 2:
+            continue
+        index[top] = []
+        for owner in owners:
+            portions = _namespace_portions(by_name[owner[0]], top)
+            if portions is None:
+                index[top].append(owner)
+                continue
+            for portion in portions:
+                index.setdefault(portion, []).append(owner)
+    return index
+
+def _index_key(index, module):
+    """The longest dotted prefix of module that is in index, else its top-level name."""
+    parts = module.split(".")
+    for depth in range(len(parts), 1, -1):
+        key = ".".join(parts[:depth])
+        if key in index:
+            return key
+    return parts[0]
+
+def resolve_versions(import_sources, index=None):
+    """Returns {distribution: {"line", "version", "imports", "sources"}} for every third-party import."""
     resolved = {}
-    stdlib_modules = set(sys.builtin_module_names) | set(dir(builtins))
+    if index is None:
+        index = build_distribution_index()
 
-    for package in tqdm(import_sources, desc="Resolving versions"):
-        if package in stdlib_modules:
+    # Dotted imports share an index key (numpy.linalg, numpy.fft -> numpy)
+    key_sources = {}
+    for module, sources in import_sources.items():
+        key_sources.setdefault(_index_key(index, module), set()).update(sources)
+
+    for package in tqdm(key_sources, desc="Resolving versions"):
+        if package in STDLIB_MODULES:
             log(f"[SKIP] {package} is a built-in module")
             continue
-        try:
-            pkg_version = version(package)
-            resolved[package] = {
-                "line": f"{package}=={pkg_version}",
-                "sources": import_sources[package]
-            }
-            log(f"[RESOLVE] {package}=={pkg_version}")
-        except PackageNotFoundError:
-            log(f"[SKIP] {package} is not pip-installable")
+
+        dists = index.get(package)
+        if not dists:
+            if package in index:
+                log(f"[SKIP] {package} is a namespace package, only its sub-packages are installable")
+            else:
+                log(f"[SKIP] {package} is not pip-installable")
+            continue
+
+        for dist_name, dist_version in dists:
+            entry = resolved.setdefault(dist_name, {
+                "line": f"{dist_name}=={dist_version}",
+                "version": dist_version,
+                "imports": set(),
+                "sources": set(),
+            })
+            entry["imports"].add(package)
+            entry["sources"] |= key_sources[package]
+            if dist_name == package:
+                log(f"[RESOLVE] {package}=={dist_version}")
+            else:
+                log(f"[RESOLVE] {package} -> {dist_name}=={dist_version}")
     return resolved
 
 
-def parse_existing_requirements(path="requirements.txt"):
+def _parse_requirements_text(text):
     existing = {}
-    if not Path(path).exists():
-        return existing
-    for line in Path(path).read_text(encoding="utf-8").splitlines():
+    for line in text.splitlines():
         line = line.strip()
         if not line or line.startswith("#"):
             continue
@@ -103,38 +762,421 @@ def parse_existing_requirements(path="requirements.txt"):
             existing[line.strip()] = None
     return existing
 
-def write_requirements(resolved, _, output_path="requirements.txt", project_dir="."):
-    existing = parse_existing_requirements(output_path)
-    new_pkgs = set(resolved)
-    old_pkgs = set(existing)
+def render_requirements(resolved):
+    """
+    The requirements file as text: each pinned line followed by where it is used.
+
+    Sources are project-relative keys, so the annotations need only string
+    operations, no filesystem lookups.
+    """
+    lines = []
+    for package in tqdm(sorted(resolved), desc="Writing requirements"):
+        annotations = set()
+        for src in resolved[package]["sources"]:
+            parent, name = posixpath.split(src)
+            annotations.add(posixpath.basename(parent) if parent else name)
+
+        lines.append(resolved[package]["line"])
+        lines.append(f"# Used in: {', '.join(sorted(annotations))}")
+    return "".join(line + "\n" for line in lines)
+
+def _write_atomic(path, text):
+    """Replace path with text via a temp file in the same directory, keeping its mode."""
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".requirements-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def write_requirements(
+    resolved, _, output_path="requirements.txt", check=False, diff_out=None
+):
+    """
+    Write output_path if its content would change; returns True if it differs.
 
-    removed = old_pkgs - new_pkgs
+    With check=True nothing is written: a unified diff against the current
+    file is printed to diff_out (default: stdout) instead.
+    """
+    try:
+        with open(output_path, encoding="utf-8", newline="") as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = None
+
+    existing = _parse_requirements_text(current or "")
+    removed = set(existing) - set(resolved)
     for pkg in sorted(removed):
         log(f"[REMOVED] {pkg} no longer imported")
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        for package in tqdm(sorted(resolved), desc="Writing requirements"):
-            line = resolved[package]["line"]
-            sources = sorted(resolved[package]["sources"])
+    text = render_requirements(resolved)
+    if text == current:
+        log(f"[DONE] {output_path} is up to date")
+        return False
 
-            annotations = []
-            for src in sources:
-                path = Path(src)
-                if path.parent.resolve() == Path(project_dir).resolve():
-                    annotations.append(path.name)
-                else:
-                    annotations.append(path.parent.name)
+    if check:
+        import difflib
 
-            comment = f"# Used in: {', '.join(sorted(set(annotations)))}"
-            f.write(f"{line}\n{comment}\n")
+        diff = difflib.unified_diff(
+            (current or "").splitlines(keepends=True),
+            text.splitlines(keepends=True),
+            fromfile=output_path,
+            tofile=f"{output_path} (generated)",
+        )
+        (diff_out or sys.stdout).writelines(diff)
+        log(f"[CHECK] {output_path} is out of date")
+        return True
 
+    _write_atomic(output_path, text)
     log(f"[DONE] Requirements written to {output_path}")
+    return True
+
+def build_report(resolved, project_dir, output_path, changed, stats, timings):
+    """Everything --format json prints: the requirements, where they come from, and run stats."""
+    return {
+        "project_dir": project_dir,
+        "output": output_path,
+        "changed": changed,
+        "requirements": [
+            {
+                "distribution": dist_name,
+                "version": entry["version"],
+                "imports": sorted(entry["imports"]),
+                "sources": sorted(entry["sources"]),
+            }
+            for dist_name, entry in sorted(resolved.items())
+        ],
+        "stats": {**stats, "timings": {name: round(seconds, 6) for name, seconds in timings.items()}},
+    }
+
+def generate(args, cache_path, memo=None, index=None, dirs=None):
+    """One scan, resolve and write pass; returns the report."""
+    project_dir = args.project_dir
+    workers = args.workers or os.cpu_count() or 1
+    entries = [os.path.join(project_dir, entry) for entry in args.entry or []]
+    stats = {}
+    timings = {}
+
+    start = time.perf_counter()
+    import_sources = scan_project_for_imports(
+        project_dir, workers, args.chunk_size, cache_path, args.extractor, entries,
+        memo=memo, stats=stats, dirs=dirs, read_only_cache=args.check,
+    )
+    timings["scan"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    resolved = resolve_versions(import_sources, index)
+    timings["resolve"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    diff_out = sys.stderr if args.format == "json" else sys.stdout
+    changed = write_requirements(
+        resolved, import_sources, check=args.check, diff_out=diff_out
+    )
+    timings["write"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+
+    return build_report(resolved, project_dir, "requirements.txt", changed, stats, timings)
+
+def print_report(report, compact=False):
+    json.dump(report, sys.stdout, indent=None if compact else 2)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+class InotifyWatcher:
+    """
+    Change notifications for a set of directories through inotify, called
+    via ctypes since the standard library has no binding. Linux only; the
+    constructor raises OSError or AttributeError elsewhere.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, debounce=0.05):
+        import ctypes
+
+        self._ctypes = ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.debounce = debounce
+        self._dirs = {}
+        self._wds = {}
+        self._overflowed = False
+
+    def watch(self, dirs):
+        for directory in dirs:
+            if directory in self._wds:
+                continue
+            wd = self._add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                errno = self._ctypes.get_errno()
+                raise OSError(errno, f"inotify_add_watch {directory}: {os.strerror(errno)}")
+            self._wds[directory] = wd
+            self._dirs[wd] = directory
+
+    def _read(self, changed):
+        data = os.read(self.fd, 1 << 16)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b"\0"))
+            offset += self.EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # The kernel queue filled up and dropped events (wd is -1)
+                self._overflowed = True
+                continue
+            directory = self._dirs.get(wd)
+            if mask & IN_IGNORED:
+                self._wds.pop(self._dirs.pop(wd, None), None)
+                continue
+            if directory is None or not name:
+                continue
+            if mask & IN_ISDIR or name.endswith(".py") or name == ".gitignore":
+                changed.add(os.path.join(directory, name))
+
+    def wait(self):
+        """
+        Block until a relevant change, then collect the burst; returns the
+        changed paths, or None if events were lost and anything may have changed.
+        """
+        changed = set()
+        while not changed and not self._overflowed:
+            select.select([self.fd], [], [])
+            self._read(changed)
+        # Editors save in several steps (temp file, rename, chmod)
+        while select.select([self.fd], [], [], self.debounce)[0]:
+            self._read(changed)
+        if self._overflowed:
+            self._overflowed = False
+            return None
+        return changed
+
+class PollingWatcher:
+    """Fallback for watch mode: compares stat snapshots of the project every interval."""
+
+    def __init__(self, project_dir, interval=0.5):
+        self.project_dir = project_dir
+        self.interval = interval
+        self._snapshot = self._take()
+
+    def _take(self):
+        snapshot = {}
+        dirs = []
+        for path, _ in iter_python_files(self.project_dir, dirs):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        for directory in dirs:
+            path = os.path.join(directory, ".gitignore")
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def watch(self, dirs):
+        pass
+
+    def wait(self):
+        while True:
+            time.sleep(self.interval)
+            snapshot = self._take()
+            changed = {
+                path for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+def watch(args, cache_path):
+    """
+    Regenerate requirements whenever a .py or .gitignore file changes.
+
+    Extracted imports and the distribution index stay in memory, so only
+    the changed files are read again. The on-disk cache is only used for
+    the first pass. Restart to pick up newly installed distributions.
+    """
+    memo = {}
+    index = build_distribution_index()
+
+    # Watch before the first pass, the slow cold one, so edits made during
+    # it are queued for the first wait() instead of lost
+    dirs = []
+    for _ in iter_python_files(args.project_dir, dirs):
+        pass
+    try:
+        watcher = InotifyWatcher()
+        watcher.watch(dirs)
+        log(f"[WATCH] inotify on {len(dirs)} directories")
+    except (OSError, AttributeError) as e:
+        watcher = PollingWatcher(args.project_dir, args.poll_interval)
+        log(f"[WATCH] inotify unavailable ({e}), polling every {args.poll_interval}s")
+
+    dirs = []
+    report = generate(args, cache_path, memo, index, dirs)
+    watcher.watch(dirs)
+    if args.format == "json":
+        print_report(report, compact=True)
+    flush_log()
+
+    try:
+        while True:
+            changed = watcher.wait()
+            if changed is None:
+                log("[WATCH] inotify queue overflowed, rescanning every file")
+                memo.clear()
+                changed = ()
+            for path in changed:
+                memo.pop(path, None)
+
+            dirs = []
+            try:
+                report = generate(args, None, memo, index, dirs)
+            except ValueError as e:
+                log(f"[ERROR] {e}")
+                flush_log()
+                continue
+            watcher.watch(dirs)
+
+            stats = report["stats"]
+            log(
+                f"[WATCH] {len(changed)} changed, {stats['parsed']} parsed, "
+                f"regenerated in {stats['timings']['total'] * 1000:.1f} ms"
+            )
+            if args.format == "json":
+                print_report(report, compact=True)
+            flush_log()
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate requirements.txt from a project's imports")
+    parser.add_argument("project_dir", nargs="?", default=".", help="Project to scan (default: .)")
+    parser.add_argument(
+        "-j", "--workers",
+        type=int,
+        default=1,
+        help="Processes used to parse files; 0 = all cores (default: 1)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Files sent to a worker per round trip (default: automatic)",
+    )
+    parser.add_argument(
+        "--extractor",
+        choices=list(EXTRACTORS),
+        default="scan",
+        help="scan: regex scan with AST fallback; ast: full parse of every file (default: scan)",
+    )
+    parser.add_argument(
+        "--entry",
+        action="append",
+        default=None,
+        metavar="FILE",
+        help="Only count imports reachable from this script (relative to project_dir); repeatable",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help=f"Import cache file (default: <project_dir>/{IMPORT_CACHE_NAME})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every file and do not read or write the import cache",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Write nothing (requirements.txt, cache, log); print a diff and exit 1 if it is out of date",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="json: also print distributions, versions, sources and timings as JSON on stdout",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and regenerate requirements.txt whenever a .py or .gitignore file changes",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.5,
+        help="Seconds between scans when --watch cannot use inotify (default: 0.5)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=list(LOG_LEVELS),
+        default="DEBUG",
+        help="Lowest level written to the log; INFO drops [IMPORTS]/[SKIP] lines (default: DEBUG)",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Write the log as JSON lines (.jsonl)",
+    )
+    args = parser.parse_args()
+    if args.watch and args.check:
+        parser.error("--watch cannot be combined with --check")
+    return args
 
 
 if __name__ == "__main__":
-    project_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    args = parse_args()
+    # --check is for CI and must not write anything, the log included
+    configure_logging(args.log_level, args.log_json, to_file=not args.check)
+    # Make SIGTERM go through atexit so buffered log lines are not lost
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    project_dir = args.project_dir
     log(f"[BOOT] Starting scan in {project_dir}")
-    import_sources = scan_project_for_imports(project_dir)
-    resolved = resolve_versions(import_sources)
-    write_requirements(resolved, import_sources, project_dir=project_dir)
-    log("[EXIT] Diagnostic pass complete")
\ No newline at end of file
+    cache_path = None if args.no_cache else (args.cache or os.path.join(project_dir, IMPORT_CACHE_NAME))
+    try:
+        if args.watch:
+            watch(args, cache_path)
+            sys.exit(0)
+        report = generate(args, cache_path)
+    except ValueError as e:
+        log(f"[ERROR] {e}")
+        sys.exit(f"Error: {e}")
+    if args.format == "json":
+        print_report(report)
+    log("[EXIT] Diagnostic pass complete")
+    if args.check and report["changed"]:
+        sys.exit(1)
@@ -3,9 +3,14 @@
 """"""Unauthorized use is subject to copyright and intellectual property laws."""
 
 import os
+import sys
+import argparse
 from pathlib import Path
 import pathspec
 
+INDENT = ' ' * 4
+
+
 def load_gitignore_spec(startpath: str):
     gitignore_path = Path(startpath) / '.gitignore'
     if not gitignore_path.exists():
@@ -21,43 +26,133 @@ def load_gitignore_spec(startpath: str):
     return pathspec.PathSpec.from_lines('gitwildmatch', patterns)
 
 
-def list_folder_structure(startpath: str, output_file: str):
-    """Recursively list the folder structure starting from the given path,
-    ignoring files and folders listed in .gitignore.
-    
+def _scan(path: str, rel_dir: str, spec, sort: bool, skip: set):
+    """Yield (entry, rel_path, is_dir) for every entry of path that is not ignored.
+
+    Unreadable directories yield nothing, as with os.walk.
+    """
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    skip_names = {os.path.basename(path) for path in skip}
+    with it:
+        entries = sorted(it, key=lambda e: e.name) if sort else it
+        for entry in entries:
+            if entry.name == '.git':
+                continue
+            if entry.name in skip_names and os.path.abspath(entry.path) in skip:
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            # A trailing slash lets directory-only patterns such as "build/" match
+            if spec and spec.match_file(rel_path + '/' if is_dir else rel_path):
+                continue
+            yield entry, rel_path, is_dir
+
+
+def iter_folder_structure(startpath: str, spec=None, max_depth: int = None,
+                          max_entries: int = None, sort: bool = True, skip=()):
+    """Yield the lines of the folder structure as the tree is walked.
+
+    Ignored directories are pruned before they are opened. The walk keeps
+    one open directory per level, so memory does not grow with the size of
+    the tree; with sort, each open level also holds its directory's entries.
+
     Args:
         startpath (str): The path to start listing the folder structure.
-        output_file (str, optional): The file to write the output to. If None, print to console.
+        spec (pathspec.PathSpec, optional): Patterns of files and folders to leave out.
+        max_depth (int, optional): Levels below startpath to list, 0 for startpath alone; deeper folders are shown but not opened.
+        max_entries (int, optional): Entries listed per folder, followed by a count of the rest.
+        sort (bool): List entries by name instead of in directory order.
+        skip (iterable of str): Paths left out of the listing, such as the output file.
     """
-    output = []
-    spec = load_gitignore_spec(startpath)
+    skip = {os.path.abspath(path) for path in skip}
+    yield f"{os.path.basename(os.path.abspath(startpath))}/"
+    if max_depth is not None and max_depth < 1:
+        return
 
-    for root, dirs, files in os.walk(startpath):
-        rel_root = os.path.relpath(root, startpath)
-        if spec and spec.match_file(rel_root):
+    # [entries, depth, entries listed so far] for every open folder
+    stack = [[_scan(startpath, '', spec, sort, skip), 1, 0]]
+    while stack:
+        frame = stack[-1]
+        entries, depth, listed = frame
+        item = next(entries, None)
+        if item is None:
+            stack.pop()
             continue
 
-        level = rel_root.count(os.sep)
-        indent = ' ' * 4 * level
-        output.append(f"{indent}{os.path.basename(root)}/")
+        if max_entries is not None and listed >= max_entries:
+            hidden = 1 + sum(1 for _ in entries)
+            stack.pop()
+            yield f"{INDENT * depth}... ({hidden} more)"
+            continue
+        frame[2] += 1
+
+        entry, rel_path, is_dir = item
+        if not is_dir:
+            yield f"{INDENT * depth}{entry.name}"
+            continue
+        yield f"{INDENT * depth}{entry.name}/"
+        if not entry.is_symlink() and (max_depth is None or depth < max_depth):
+            stack.append([_scan(entry.path, rel_path, spec, sort, skip), depth + 1, 0])
 
-        # Filter dirs in-place to avoid descending into ignored folders
-        dirs[:] = [d for d in dirs if not (spec and spec.match_file(os.path.join(rel_root, d)))]
 
-        subindent = ' ' * 4 * (level + 1)
-        for f in files:
-            rel_file = os.path.join(rel_root, f)
-            if spec and spec.match_file(rel_file):
-                continue
-            output.append(f"{subindent}{f}")
+def list_folder_structure(startpath: str, output_file: str, max_depth: int = None,
+                          max_entries: int = None, sort: bool = True):
+    """Recursively list the folder structure starting from the given path,
+    ignoring files and folders listed in .gitignore.
+
+    Lines are written as they are produced, so output starts at once and
+    memory stays flat on large trees.
+
+    Args:
+        startpath (str): The path to start listing the folder structure.
+        output_file (str, optional): The file to write the output to. If None, print to console.
+        max_depth (int, optional): Levels below startpath to list.
+        max_entries (int, optional): Entries listed per folder.
+        sort (bool): List entries by name instead of in directory order.
+    """
+    spec = load_gitignore_spec(startpath)
 
     if output_file:
-        with open(output_file, 'w') as file:
-            file.write('\n'.join(output))
+        lines = iter_folder_structure(startpath, spec, max_depth, max_entries, sort, skip=[output_file])
+        with open(output_file, 'w', encoding='utf-8') as file:
+            file.writelines(line + '\n' for line in lines)
         print(f"Folder structure written to {output_file}")
     else:
-        print('\n'.join(output))
+        lines = iter_folder_structure(startpath, spec, max_depth, max_entries, sort)
+        sys.stdout.writelines(line + '\n' for line in lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write the folder structure of a project, skipping .gitignore'd paths")
+    parser.add_argument('startpath', nargs='?', default='./', help="Folder to list (default: ./)")
+    parser.add_argument(
+        '-o', '--output',
+        default='./folder_structure.txt',
+        help="Output file, or - for stdout (default: ./folder_structure.txt)",
+    )
+    parser.add_argument('--max-depth', type=int, help="Levels below the start folder to list (0: the start folder only)")
+    parser.add_argument('--max-entries-per-dir', type=int, help="Entries listed per folder before '... (N more)'")
+    parser.add_argument('--unsorted', action='store_true', help="Keep directory order instead of sorting by name")
+    args = parser.parse_args()
+    if args.max_depth is not None and args.max_depth < 0:
+        parser.error(f"--max-depth must be 0 or more, got {args.max_depth}")
+    if args.max_entries_per_dir is not None and args.max_entries_per_dir < 0:
+        parser.error(f"--max-entries-per-dir must be 0 or more, got {args.max_entries_per_dir}")
+    return args
+
 
-# Example usage
 if __name__ == "__main__":
-    list_folder_structure('./', './folder_structure.txt')
+    args = parse_args()
+    list_folder_structure(
+        args.startpath,
+        None if args.output == '-' else args.output,
+        args.max_depth,
+        args.max_entries_per_dir,
+        sort=not args.unsorted,
+    )